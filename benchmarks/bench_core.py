@@ -0,0 +1,230 @@
+"""
+核心流程基准测试：生成合成监控目录，分别计时 RuleMatcher.match / Organizer._move_file /
+HistoryManager.add_record / run_now / undo_last_action，结果输出为 JSON，便于跨提交对比
+
+    python benchmarks/bench_core.py                              # 默认 2000 个文件
+    python benchmarks/bench_core.py --files 20000 --collisions 0.3 --output before.json
+    python benchmarks/bench_core.py --mix "jpg:5,pdf:3,mp4:1,xyz:1" --repeat 3
+
+所有数据 (配置、历史记录) 都写在临时目录中，不会影响真实的 ZenFile 配置
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# 必须在导入 zenfile 之前指定配置目录
+_APPDATA = tempfile.mkdtemp(prefix="zenfile-bench-")
+os.environ["APPDATA"] = _APPDATA
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logging
+from zenfile.utils.config import load_config
+from zenfile.core.rules import RuleMatcher
+from zenfile.core.organizer import Organizer
+from zenfile.core.history import HistoryManager
+
+DEFAULT_MIX = "jpg:4,png:2,pdf:3,docx:2,mp4:1,mp3:1,zip:1,py:1,xyz:1"
+KEYWORDS = ["合同", "发票", "report", "截图", "draft"]
+
+
+# ---------- 合成数据 ----------
+def parse_mix(text):
+    mix = []
+    for part in text.split(","):
+        ext, _, weight = part.strip().partition(":")
+        mix.append(("." + ext.lstrip("."), float(weight or 1)))
+    return mix
+
+
+def make_names(count, mix, keyword_ratio, rng):
+    exts = [e for e, _ in mix]
+    weights = [w for _, w in mix]
+    names = []
+    for i in range(count):
+        stem = f"file_{i:06d}"
+        if rng.random() < keyword_ratio:
+            stem = f"{rng.choice(KEYWORDS)}_{stem}"
+        names.append(stem + rng.choices(exts, weights)[0])
+    return names
+
+
+def populate(directory, names, matcher, collisions, rng, size=256):
+    """在 directory 中创建文件；按 collisions 比例在对应分类文件夹中预先放置同名文件"""
+    directory.mkdir(parents=True, exist_ok=True)
+    payload = os.urandom(size)
+    for name in names:
+        path = directory / name
+        path.write_bytes(payload)
+        if collisions and rng.random() < collisions:
+            ignore, folder = matcher.match(path)
+            if ignore: continue
+            dest = directory / folder
+            dest.mkdir(parents=True, exist_ok=True)
+            (dest / name).write_bytes(b"existing")
+
+
+# ---------- 统计 ----------
+def summarize(samples, total=None):
+    """samples 为单次耗时 (秒)；total 为整体耗时 (批量操作时只有一个总数)"""
+    total = sum(samples) if total is None else total
+    result = {"n": len(samples), "total_s": round(total, 6),
+              "ops_per_s": round(len(samples) / total, 1) if total else None}
+    if samples:
+        ordered = sorted(samples)
+        def pct(p): return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1e6, 2)
+        result.update({
+            "mean_us": round(statistics.fmean(ordered) * 1e6, 2),
+            "p50_us": pct(0.50), "p95_us": pct(0.95), "p99_us": pct(0.99),
+        })
+    return result
+
+
+def best_of(runs):
+    """多次重复取总耗时最短的一次"""
+    return min(runs, key=lambda r: r["total_s"])
+
+
+# ---------- 各项基准 ----------
+def bench_match(config, names, workdir):
+    matcher = RuleMatcher(config)
+    paths = [workdir / n for n in names]
+    samples = []
+    for p in paths:
+        t = time.perf_counter()
+        matcher.match(p)
+        samples.append(time.perf_counter() - t)
+    return summarize(samples)
+
+
+def bench_add_record(count):
+    samples = []
+    for i in range(count):
+        t = time.perf_counter()
+        HistoryManager.add_record(f"/bench/src/{i}.txt", f"/bench/dst/{i}.txt", batch_id="bench")
+        samples.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    HistoryManager.flush()
+    r = summarize(samples)
+    r["flush_s"] = round(time.perf_counter() - t, 6)
+    return r
+
+
+def bench_move_file(organizer, names, workdir, collisions, rng):
+    populate(workdir, names, organizer.matcher, collisions, rng)
+    batch_id = str(uuid.uuid4())
+    samples = []
+    for n in names:
+        source = workdir / n
+        ignore, folder = organizer.matcher.match(source)
+        if ignore: continue
+        t = time.perf_counter()
+        organizer._move_file(source, folder, batch_id)
+        samples.append(time.perf_counter() - t)
+    HistoryManager.flush()
+    return summarize(samples)
+
+
+def bench_run_now(organizer, names, workdir, collisions, rng):
+    populate(workdir, names, organizer.matcher, collisions, rng)
+    organizer.reload_config(dict(organizer.config, watch_dirs=[str(workdir)]))
+    r = organizer.run_now()
+    HistoryManager.flush()
+    result = summarize([], total=r["elapsed"])
+    result.update({"n": r["total"], "moved": r["moved"],
+                   "ops_per_s": round(r["total"] / r["elapsed"], 1) if r["elapsed"] else None})
+    return result
+
+
+def bench_undo(organizer):
+    count = len(HistoryManager.get_batch(HistoryManager.last_batch_id()) or [])
+    t = time.perf_counter()
+    ok, msg = organizer.undo_last_action()
+    elapsed = time.perf_counter() - t
+    result = summarize([], total=elapsed)
+    result.update({"n": count, "ops_per_s": round(count / elapsed, 1) if elapsed else None,
+                   "ok": ok, "message": msg})
+    return result
+
+
+# ---------- 入口 ----------
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=Path(__file__).resolve().parent).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    config = load_config()
+    config.update({"ready_settle_time": 0, "watch_dirs": []})
+    logger = logging.getLogger("ZenFile.bench")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    base = Path(tempfile.mkdtemp(prefix="zenfile-bench-data-"))
+    results = {}
+    try:
+        for i in range(args.repeat):
+            names = make_names(args.files, mix, args.keyword_ratio, rng)
+            organizer = Organizer(config, logger)
+            run_results = {
+                "match": bench_match(config, names, base / f"match{i}"),
+                "add_record": bench_add_record(args.files),
+                "move_file": bench_move_file(organizer, names, base / f"move{i}", args.collisions, rng),
+                "run_now": bench_run_now(organizer, names, base / f"run{i}", args.collisions, rng),
+                "undo_last_action": bench_undo(organizer),
+            }
+            organizer.shutdown(wait=True)
+            for key, value in run_results.items():
+                results.setdefault(key, []).append(value)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+        shutil.rmtree(_APPDATA, ignore_errors=True)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "files": args.files, "mix": args.mix, "collisions": args.collisions,
+            "keyword_ratio": args.keyword_ratio, "repeat": args.repeat, "seed": args.seed,
+        },
+        "results": {k: best_of(v) for k, v in results.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ZenFile 核心流程基准测试")
+    parser.add_argument("--files", type=int, default=2000, help="每项测试的文件数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="扩展名比例，如 jpg:4,pdf:3,xyz:1")
+    parser.add_argument("--collisions", type=float, default=0.1, help="目标文件夹中已有同名文件的比例 (0~1)")
+    parser.add_argument("--keyword-ratio", type=float, default=0.1, help="文件名含关键词的比例 (0~1)")
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数，取最快一次")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果写入该 JSON 文件 (默认输出到标准输出)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
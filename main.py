@@ -2,16 +2,17 @@ import sys
 import os
 import platform
 import threading
-import tkinter as tk
+import multiprocessing
 from pathlib import Path
-from pynput import keyboard
 
-# 引入核心组件
+# 引入核心组件 (GUI / 热键相关模块在 main() 中按需导入，见 zenfile/cli.py 的无界面模式)
 from zenfile.utils.config import load_config
-from zenfile.utils.logger import setup_logger
+from zenfile.utils.logger import setup_logger, shutdown_logger
 from zenfile.core.organizer import Organizer
 from zenfile.core.monitor import MonitorManager
-from zenfile.ui.tray import SystemTray
+from zenfile.core.history import HistoryManager
+from zenfile.core.reloader import ConfigReloader
+from zenfile.utils.metrics import MetricsExporter
 
 # Windows 单例锁
 if platform.system() == "Windows":
@@ -47,6 +48,7 @@ class HotkeyManager:
                 except Exception as e:
                     self.logger.error(f"快捷键回调出错: {e}")
 
+            from pynput import keyboard
             hotkey_map = {hotkey_str: on_activate}
             self.listener = keyboard.GlobalHotKeys(hotkey_map)
             self.listener.start()
@@ -75,11 +77,13 @@ def main():
         sys.exit(0)
 
     # 初始化
-    logger = setup_logger()
     config = load_config()
+    logger = setup_logger(config)
     logger.info(">>> ZenFile 启动中...")
 
     #  GUI 上下文
+    import tkinter as tk
+    from zenfile.ui.tray import SystemTray
     root = tk.Tk()
     root.withdraw()
 
@@ -87,13 +91,18 @@ def main():
     organizer = Organizer(config, logger)
     monitor_manager = MonitorManager(organizer, logger)
     monitor_manager.start(config.get("watch_dirs", []))
+    metrics_exporter = MetricsExporter(config, logger).start()
 
     # 定义退出逻辑
     def app_shutdown():
         logger.info("正在退出应用程序...")
         if hotkey_manager: hotkey_manager.stop()
         if tray and tray.icon: tray.icon.stop()
+        config_reloader.stop()
         monitor_manager.stop()
+        metrics_exporter.stop()
+        HistoryManager.flush()  # os._exit 不会触发 atexit，需手动落盘
+        shutdown_logger()
         try: root.quit()
         except: pass
         os._exit(0)
@@ -112,6 +121,15 @@ def main():
     initial_hotkey = config.get("hotkey", "<ctrl>+<alt>+z")
     hotkey_manager.start(initial_hotkey)
 
+    # 配置热重载：手动编辑 settings.json 后自动生效
+    def on_config_change(old, new):
+        if old.get("hotkey") != new.get("hotkey"):
+            hotkey_manager.restart(new.get("hotkey"))
+
+    config_reloader = ConfigReloader(organizer, monitor_manager, logger, on_change=on_config_change)
+    if config.get("config_hot_reload", True):
+        config_reloader.start()
+
     # 启动托盘线程
     tray_thread = threading.Thread(target=tray.run, daemon=True)
     tray_thread.start()
@@ -123,4 +141,5 @@ def main():
         app_shutdown()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后进程池 (重复检测) 需要
     main()
\ No newline at end of file
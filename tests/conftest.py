@@ -0,0 +1,63 @@
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# 配置目录在导入 zenfile 时确定，测试使用独立的临时目录，不影响本机的 ZenFile 配置与历史
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="zenfile-test-")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zenfile.core.history import HistoryManager  # noqa: E402
+from zenfile.utils.config import HISTORY_PATH, JOURNAL_PATH  # noqa: E402
+
+OLD = 1_000_000_000  # 足够早的修改时间，文件直接视为已就绪
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """每个测试从空的历史与移动日志开始"""
+    HistoryManager.flush()
+    HistoryManager._records = None
+    for path in (HISTORY_PATH, JOURNAL_PATH):
+        if path.exists(): path.unlink()
+    yield
+    HistoryManager.flush()
+
+
+@pytest.fixture
+def logger():
+    log = logging.getLogger("ZenFile.test")
+    log.propagate = False
+    if not log.handlers:
+        log.addHandler(logging.NullHandler())
+    return log
+
+
+@pytest.fixture
+def write_old():
+    """写入文件并把修改时间设为很早以前 (跳过就绪等待)"""
+    def write(path, text):
+        path.write_text(text, encoding="utf-8")
+        os.utime(path, (OLD, OLD))
+        return path
+    return write
+
+
+@pytest.fixture
+def make_organizer(logger):
+    from zenfile.core.organizer import Organizer
+    created = []
+
+    def make(watch_dir, **extra):
+        config = {"watch_dirs": [str(watch_dir)], "rules": {"Docs": [".txt"]}}
+        config.update(extra)
+        org = Organizer(config, logger)
+        created.append(org)
+        return org
+
+    yield make
+    for org in created:
+        org.shutdown()
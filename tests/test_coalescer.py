@@ -0,0 +1,57 @@
+import threading
+import time
+
+from zenfile.core.coalescer import EventCoalescer
+
+
+def _collector():
+    emitted, lock = [], threading.Lock()
+
+    def callback(path):
+        with lock:
+            emitted.append(path)
+    return emitted, callback
+
+
+def test_burst_on_one_path_collapses_to_one_call():
+    emitted, callback = _collector()
+    co = EventCoalescer(callback, quiet_window=0.1)
+    co.start()
+    try:
+        for _ in range(50):
+            co.submit("a")
+        for _ in range(10):
+            co.submit("b")
+        time.sleep(0.4)
+        assert sorted(emitted) == ["a", "b"]
+        assert co.stats() == {"received": 60, "emitted": 2, "collapsed": 58, "pending": 0}
+    finally:
+        co.stop()
+
+
+def test_events_inside_window_extend_the_deadline():
+    emitted, callback = _collector()
+    co = EventCoalescer(callback, quiet_window=0.15)
+    co.start()
+    try:
+        for _ in range(4):
+            co.submit("a")
+            time.sleep(0.08)  # 间隔小于静默窗口，一直不处理
+        assert emitted == []
+        time.sleep(0.3)
+        assert emitted == ["a"]
+    finally:
+        co.stop()
+
+
+def test_discard_and_stop_flush():
+    emitted, callback = _collector()
+    co = EventCoalescer(callback, quiet_window=10)
+    co.start()
+    co.submit("moved-away")
+    co.submit("kept")
+    co.submit("kept")
+    co.discard("moved-away")
+    co.stop()  # 退出时立即处理仍在等待的路径
+    assert emitted == ["kept"]
+    assert co.stats() == {"received": 3, "emitted": 1, "collapsed": 2, "pending": 0}
@@ -0,0 +1,50 @@
+import os
+
+from zenfile.core import organizer as organizer_module
+from zenfile.core.history import HistoryManager
+
+
+def _setup(tmp_path, write_old):
+    docs = tmp_path / "Docs"
+    docs.mkdir()
+    write_old(docs / "a.txt", "same content")
+    return write_old(tmp_path / "a.txt", "same content")
+
+
+def test_skip_mode_leaves_duplicate_in_place(tmp_path, write_old, make_organizer):
+    source = _setup(tmp_path, write_old)
+    org = make_organizer(tmp_path, dedup_mode="skip")
+    assert org._move_file(source, "Docs") is False
+    assert source.exists()
+    assert sorted(p.name for p in (tmp_path / "Docs").iterdir()) == ["a.txt"]
+
+
+def test_hardlink_mode_links_duplicate(tmp_path, write_old, make_organizer):
+    source = _setup(tmp_path, write_old)
+    org = make_organizer(tmp_path, dedup_mode="hardlink")
+    assert org._move_file(source, "Docs") is True
+    assert not source.exists()
+    assert os.path.samefile(tmp_path / "Docs" / "a.txt", tmp_path / "Docs" / "a_1.txt")
+
+
+def test_failed_hardlink_leaves_no_stray_link(tmp_path, write_old, make_organizer, monkeypatch):
+    source = _setup(tmp_path, write_old)
+    org = make_organizer(tmp_path, dedup_mode="hardlink")
+    real_unlink = os.unlink
+    failures = []
+
+    def unlink(path, *args, **kwargs):
+        # 源文件第一次删除失败 (如被占用)，之后正常
+        if str(path) == str(source) and not failures:
+            failures.append(path)
+            raise PermissionError(13, "模拟删除失败", str(path))
+        return real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(organizer_module.os, "unlink", unlink)
+    assert org._move_file(source, "Docs") is True
+    assert failures and not source.exists()
+    names = sorted(p.name for p in (tmp_path / "Docs").iterdir())
+    assert names == ["a.txt", "a_1.txt"]  # 按普通文件移动到同一个预留名，没有残留的硬链接
+    assert not os.path.samefile(tmp_path / "Docs" / "a.txt", tmp_path / "Docs" / "a_1.txt")
+    assert len(HistoryManager.load_history()) == 1
+    assert not org.journal._open
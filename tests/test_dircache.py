@@ -0,0 +1,43 @@
+import threading
+
+from zenfile.core.dircache import DirectoryCache
+
+
+def test_reserve_resolves_collisions_without_probing(tmp_path):
+    (tmp_path / "a.txt").write_text("x")
+    cache = DirectoryCache()
+    assert cache.reserve(tmp_path, "a.txt").name == "a_1.txt"
+    assert cache.reserve(tmp_path, "a.txt").name == "a_2.txt"
+    assert cache.reserve(tmp_path, "b.txt").name == "b.txt"
+
+
+def test_claim_commit_and_release(tmp_path):
+    cache = DirectoryCache()
+    assert cache.claim(tmp_path / "a.txt")
+    assert not cache.claim(tmp_path / "a.txt")
+    cache.release(tmp_path / "a.txt")
+    assert cache.claim(tmp_path / "a.txt")
+
+    # 已提交的名称由目录中的实际文件占用，重建索引后仍然冲突
+    (tmp_path / "a.txt").write_text("moved")
+    cache.commit(tmp_path / "a.txt")
+    cache.invalidate(tmp_path)
+    assert cache.reserve(tmp_path, "a.txt").name == "a_1.txt"
+
+
+def test_concurrent_reservations_survive_invalidate(tmp_path):
+    cache = DirectoryCache()
+    names, lock = [], threading.Lock()
+
+    def worker():
+        for i in range(300):
+            target = cache.reserve(tmp_path, "a.txt")
+            with lock:
+                names.append(target.name)
+            if i % 7 == 0:
+                cache.invalidate(tmp_path)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(names) == len(set(names)) == 8 * 300
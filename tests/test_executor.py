@@ -0,0 +1,41 @@
+import threading
+import time
+
+from zenfile.core.executor import TaskExecutor
+
+
+def test_same_key_runs_serially_and_reruns_once():
+    calls, lock = [], threading.Lock()
+    running = threading.Event()
+    release = threading.Event()
+
+    def handler(value):
+        with lock:
+            calls.append(value)
+        if value == 1:
+            running.set()
+            release.wait(2)
+
+    executor = TaskExecutor(handler, workers=4)
+    executor.submit("k", 1)
+    assert running.wait(2)
+    # 处理期间重复提交只保留最后一次，由同一线程补跑
+    for value in (2, 3, 4):
+        executor.submit("k", value)
+    release.set()
+    executor.shutdown(wait=True)
+    assert calls == [1, 4]
+
+
+def test_shutdown_is_final():
+    calls = []
+    executor = TaskExecutor(lambda value: (time.sleep(0.01), calls.append(value)), workers=2, name="Final")
+    for i in range(10):
+        assert executor.submit(f"k{i}", i)
+    executor.shutdown(wait=True)
+    assert sorted(calls) == list(range(10))
+
+    assert executor.submit("late", 99) is False
+    time.sleep(0.05)
+    assert 99 not in calls
+    assert not [t for t in threading.enumerate() if t.name.startswith("Final")]
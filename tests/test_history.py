@@ -0,0 +1,118 @@
+import json
+
+from zenfile.core import history
+from zenfile.core.history import HistoryManager
+from zenfile.utils.config import HISTORY_PATH
+
+
+def _reload():
+    HistoryManager.flush()
+    HistoryManager._records = None
+    return HistoryManager.load_history()
+
+
+def _record_line(n):
+    return json.dumps({"id": f"r{n}", "batch_id": "b", "time": "2024-01-01 00:00:00",
+                       "source": f"/in/文件{n}.txt", "target": f"/in/02_文档/文件{n}.txt"},
+                      ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def test_append_and_undo_survive_reload():
+    HistoryManager.add_record("/in/a.txt", "/in/Docs/a.txt", "b1", "Docs")
+    HistoryManager.add_records([("/in/b.txt", "/in/Docs/b.txt"), ("/in/c.txt", "/in/Docs/c.txt")], "b2")
+    HistoryManager.remove_records([r["id"] for r in HistoryManager.get_batch("b1")])
+
+    records = _reload()
+    assert [r["source"] for r in records] == ["/in/b.txt", "/in/c.txt"]
+    assert HistoryManager.last_batch_id() == "b2"
+
+
+def test_compaction_drops_undone_records(monkeypatch):
+    monkeypatch.setattr(HistoryManager, "COMPACT_LINES", 10)
+    HistoryManager.add_records([(f"/in/{i}.txt", f"/in/Docs/{i}.txt") for i in range(20)], "b")
+    HistoryManager.remove_records([r["id"] for r in HistoryManager.get_batch("b")[:18]])
+    for i in range(3):
+        HistoryManager.add_record(f"/in/x{i}.txt", f"/in/Docs/x{i}.txt")
+    HistoryManager.flush()
+
+    lines = HISTORY_PATH.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 5 and not any('"undo"' in line for line in lines)
+    assert len(_reload()) == 5
+
+
+def test_load_skips_tail_torn_inside_multibyte_char():
+    tail = _record_line(3)
+    HISTORY_PATH.write_bytes(_record_line(1) + _record_line(2) + tail[:tail.index("文".encode("utf-8")) + 1])
+
+    assert [r["id"] for r in _reload()] == ["r1", "r2"]
+    HistoryManager.add_record("/in/新.txt", "/in/02_文档/新.txt")
+    assert [r["id"] for r in _reload()][:2] == ["r1", "r2"]
+    assert len(HistoryManager.load_history()) == 3
+
+
+def test_first_append_after_torn_ascii_tail_starts_new_line():
+    HISTORY_PATH.write_bytes(_record_line(1) + b'{"id": "r2", "sou')
+
+    assert len(_reload()) == 1
+    HistoryManager.add_record("/in/a.txt", "/in/Docs/a.txt")
+    records = _reload()
+    assert len(records) == 2 and records[-1]["source"] == "/in/a.txt"
+
+
+def test_failed_flush_keeps_records_until_written(tmp_path, monkeypatch):
+    HistoryManager.load_history()
+    monkeypatch.setattr(history, "HISTORY_PATH", tmp_path / "missing" / "history.jsonl")
+    HistoryManager.add_record("/in/a.txt", "/in/Docs/a.txt")
+    HistoryManager.flush()
+    assert not HistoryManager.is_flushed()
+
+    monkeypatch.setattr(history, "HISTORY_PATH", HISTORY_PATH)
+    HistoryManager.flush()
+    assert HistoryManager.is_flushed()
+    assert [r["source"] for r in _reload()] == ["/in/a.txt"]
+
+
+def test_query_pages_newest_first_with_filters():
+    HistoryManager.load_history()
+    for day in range(1, 4):
+        with HistoryManager._lock:
+            for i in range(30):
+                folder = "Docs" if i % 3 else "Pics"
+                HistoryManager._index({"id": f"{day}-{i}", "batch_id": f"b{day}",
+                                       "time": f"2024-01-0{day} 00:00:{i:02d}",
+                                       "source": f"/in/{i}.txt", "target": f"/in/{folder}/{i}.txt"})
+
+    first, second = HistoryManager.query(page=0, page_size=50), HistoryManager.query(page=1, page_size=50)
+    assert len(first) == 50 and len(second) == 40
+    assert first[0]["id"] == "3-29" and second[-1]["id"] == "1-0"
+    assert HistoryManager.query(page=2, page_size=50) == []
+
+    pics = HistoryManager.query(page_size=100, category="Pics")
+    assert len(pics) == 30 and all(HistoryManager.category_of(r) == "Pics" for r in pics)
+    ranged = HistoryManager.query(page_size=100, since="2024-01-02 00:00:00", until="2024-01-02 23:59:59")
+    assert {r["batch_id"] for r in ranged} == {"b2"} and len(ranged) == 30
+    assert HistoryManager.categories() == ["Docs", "Pics"]
+
+
+def test_trim_evicts_whole_oldest_batches(monkeypatch):
+    monkeypatch.setattr(HistoryManager, "MAX_RECORDS", 100)
+    monkeypatch.setattr(HistoryManager, "KEEP_BATCHES", 2)
+    HistoryManager.add_records([(f"/in/a{i}", f"/in/D/a{i}") for i in range(60)], "old")
+    HistoryManager.add_records([(f"/in/b{i}", f"/in/D/b{i}") for i in range(60)], "mid")
+    HistoryManager.add_records([(f"/in/c{i}", f"/in/D/c{i}") for i in range(10)], "new")
+
+    # 超出上限时整批淘汰最早的批次，不会只留下某个批次的一部分
+    assert [b["batch_id"] for b in HistoryManager.list_batches()] == ["new", "mid"]
+    assert len(HistoryManager.get_batch("mid")) == 60
+    assert HistoryManager.get_batch("old") == []
+    assert len(_reload()) == 70
+
+
+def test_live_batch_is_never_trimmed(monkeypatch):
+    monkeypatch.setattr(HistoryManager, "MAX_RECORDS", 50)
+    monkeypatch.setattr(HistoryManager, "KEEP_BATCHES", 1)
+    with HistoryManager.live_batch("run"):
+        for i in range(80):
+            HistoryManager.add_record(f"/in/r{i}", f"/in/D/r{i}", "run")
+            HistoryManager.add_record(f"/in/w{i}", f"/in/D/w{i}")  # 同时到达的实时整理记录
+    assert len(HistoryManager.get_batch("run")) == 80
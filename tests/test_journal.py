@@ -0,0 +1,72 @@
+import json
+import shutil
+
+from zenfile.core.history import HistoryManager
+from zenfile.core.journal import MoveJournal
+from zenfile.utils.config import JOURNAL_PATH
+
+
+def _begin(op_id, source, target):
+    return json.dumps({"op": "begin", "id": op_id, "batch_id": None,
+                       "source": str(source), "target": str(target)}, ensure_ascii=False) + "\n"
+
+
+def _recover():
+    journal = MoveJournal()
+    assert journal.acquire()
+    try:
+        return journal.recover()
+    finally:
+        journal.close()
+
+
+def test_recovery_keeps_same_size_different_content(tmp_path, write_old):
+    source, target = tmp_path / "a.txt", tmp_path / "Docs" / "a.txt"
+    target.parent.mkdir()
+    write_old(source, "AAAA")
+    write_old(target, "BBBB")
+    same_src, same_dst = tmp_path / "b.txt", tmp_path / "Docs" / "b.txt"
+    write_old(same_src, "same")
+    shutil.copy2(same_src, same_dst)
+    with open(JOURNAL_PATH, "w", encoding="utf-8") as f:
+        f.write(_begin("0", source, target) + _begin("1", same_src, same_dst))
+
+    assert _recover() == {"completed": 1, "rolled_back": 0, "conflicts": 1}
+    assert source.read_text() == "AAAA" and target.read_text() == "BBBB"
+    assert not same_src.exists() and same_dst.read_text() == "same"
+
+
+def test_recovery_skips_line_torn_inside_multibyte_char(tmp_path, write_old):
+    folder = tmp_path / "02_文档"
+    folder.mkdir()
+    source, target = tmp_path / "报告.txt", folder / "报告.txt"
+    write_old(target, "moved")
+    torn = _begin("2", tmp_path / "另一个.txt", folder / "另一个.txt").encode("utf-8")
+    with open(JOURNAL_PATH, "wb") as f:
+        f.write(_begin("1", source, target).encode("utf-8"))
+        f.write(torn[:torn.index("另".encode("utf-8")) + 1])  # 断在中文字符的字节中间
+
+    assert _recover() == {"completed": 1, "rolled_back": 0, "conflicts": 0}
+    assert HistoryManager.has_record(source, target)
+    assert JOURNAL_PATH.read_bytes() == b""
+
+
+def test_recovery_keeps_journal_while_history_unwritten(tmp_path, write_old, monkeypatch):
+    source, target = tmp_path / "a.txt", tmp_path / "Docs" / "a.txt"
+    target.parent.mkdir()
+    write_old(target, "moved")
+    with open(JOURNAL_PATH, "w", encoding="utf-8") as f:
+        f.write(_begin("1", source, target) + '{"op": "beg')
+    monkeypatch.setattr(HistoryManager, "is_flushed", staticmethod(lambda: False))
+
+    journal = MoveJournal()
+    assert journal.acquire()
+    try:
+        journal.recover()
+        assert _begin("1", source, target) in JOURNAL_PATH.read_text(encoding="utf-8")
+        journal.begin(tmp_path / "b.txt", target.parent / "b.txt")
+    finally:
+        journal.close()
+    # 新意图没有接在写了一半的行后面
+    lines = JOURNAL_PATH.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["source"] == str(tmp_path / "b.txt")
@@ -0,0 +1,39 @@
+from zenfile.core.monitor import MonitorManager
+from zenfile.core.snapshot import SnapshotStore
+
+
+def _manager(tmp_path, make_organizer, logger):
+    org = make_organizer(tmp_path)
+    manager = MonitorManager(org, logger)
+    manager.watches[str(tmp_path)] = (str(tmp_path), None)
+    submitted = []
+    manager.coalescer.submit = submitted.append
+    return org, manager, submitted
+
+
+def test_catch_up_does_not_record_unprocessed_files(tmp_path, write_old, make_organizer, logger):
+    org, manager, submitted = _manager(tmp_path, make_organizer, logger)
+    write_old(tmp_path / "old.txt", "seen")
+    manager.snapshots.save({str(tmp_path): SnapshotStore.capture(tmp_path)})
+    before = manager.snapshots.path.read_bytes()
+    write_old(tmp_path / "new.txt", "offline arrival")
+
+    manager._catch_up()
+    assert submitted == [str(tmp_path / "new.txt")]
+    # 进程在整理完成前退出：快照不变，下次启动仍会补扫这个文件
+    assert manager.snapshots.path.read_bytes() == before
+    submitted.clear()
+    manager._catch_up()
+    assert submitted == [str(tmp_path / "new.txt")]
+
+
+def test_unfinished_files_are_left_out_of_the_exit_snapshot(tmp_path, write_old, make_organizer, logger):
+    org, manager, submitted = _manager(tmp_path, make_organizer, logger)
+    write_old(tmp_path / "done.txt", "handled")
+    manager.snapshots.save({str(tmp_path): SnapshotStore.capture(tmp_path)})
+    write_old(tmp_path / "busy.txt", "still writing")
+    org.unfinished.add(str(tmp_path / "busy.txt"))
+
+    manager._save_snapshots()
+    manager._catch_up()
+    assert submitted == [str(tmp_path / "busy.txt")]
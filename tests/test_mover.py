@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from zenfile.core import mover as mover_module
+from zenfile.core.journal import MoveJournal
+from zenfile.core.mover import PART_SUFFIX, MoveEngine, part_path
+from zenfile.utils.config import JOURNAL_PATH
+
+OLD = 1_000_000_000
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """源与目标视为不同设备，走跨盘复制"""
+    eng = MoveEngine(verify="hash")
+    monkeypatch.setattr(eng, "_device", lambda directory: str(directory))
+    return eng
+
+
+def _dirs(tmp_path):
+    src_dir, dst_dir = tmp_path / "src", tmp_path / "dst"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    return src_dir, dst_dir
+
+
+def test_copy_across_keeps_user_part_file(tmp_path, write_old, engine):
+    src_dir, dst_dir = _dirs(tmp_path)
+    source = write_old(src_dir / "a.txt", "data" * 1000)
+    user_file = write_old(dst_dir / ("a.txt" + PART_SUFFIX), "not ours")
+
+    method = engine.move(source, dst_dir / "a.txt")
+    assert method in ("copy_file_range", "sendfile", "copy")
+    assert not source.exists()
+    assert (dst_dir / "a.txt").read_text() == "data" * 1000
+    assert user_file.read_text() == "not ours"
+    assert sorted(p.name for p in dst_dir.iterdir()) == ["a.txt", "a.txt" + PART_SUFFIX]
+
+
+def test_copy_falls_back_to_copy2_without_kernel_copy(tmp_path, write_old, engine, monkeypatch):
+    src_dir, dst_dir = _dirs(tmp_path)
+    source = write_old(src_dir / "a.txt", "payload")
+    monkeypatch.delattr(mover_module.os, "copy_file_range", raising=False)
+    monkeypatch.delattr(mover_module.os, "sendfile", raising=False)
+    monkeypatch.setattr(mover_module.shutil, "_USE_CP_SENDFILE", False, raising=False)
+    calls = []
+    real_copy2 = mover_module.shutil.copy2
+    monkeypatch.setattr(mover_module.shutil, "copy2", lambda s, d: calls.append(d) or real_copy2(s, d))
+
+    assert engine.move(source, dst_dir / "a.txt", tag="feedbeef") == "copy"
+    assert calls == [part_path(str(dst_dir / "a.txt"), "feedbeef")]
+    assert (dst_dir / "a.txt").read_text() == "payload"
+    assert os.stat(dst_dir / "a.txt").st_mtime == OLD  # 保留了修改时间
+    assert list(dst_dir.iterdir()) == [dst_dir / "a.txt"]
+
+
+def test_failed_copy_removes_only_its_part_file(tmp_path, write_old, engine, monkeypatch):
+    src_dir, dst_dir = _dirs(tmp_path)
+    source = write_old(src_dir / "a.txt", "payload")
+    monkeypatch.setattr(engine, "_verify", lambda *a: (_ for _ in ()).throw(OSError("校验失败")))
+
+    with pytest.raises(OSError):
+        engine.move(source, dst_dir / "a.txt")
+    assert source.exists() and not any(dst_dir.iterdir())
+
+
+def test_unremovable_source_is_only_deleted_later(tmp_path, write_old, engine, monkeypatch):
+    src_dir, dst_dir = _dirs(tmp_path)
+    source = write_old(src_dir / "a.txt", "payload")
+    real_unlink = os.unlink
+
+    def unlink(path, *args, **kwargs):
+        if str(path) == str(source):
+            raise PermissionError(13, "模拟被占用", str(path))
+        return real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(mover_module.os, "unlink", unlink)
+    engine.move(source, dst_dir / "a.txt")
+    assert source.exists() and (dst_dir / "a.txt").exists()
+
+    monkeypatch.setattr(mover_module.os, "unlink", real_unlink)
+    assert engine.finish_pending(source, os.stat(source)) is True
+    assert not source.exists()
+    assert engine.finish_pending(source, os.stat(dst_dir / "a.txt")) is False
+
+
+def test_recovery_deletes_only_the_intents_part_file(tmp_path, write_old):
+    source = write_old(tmp_path / "a.txt", "payload")
+    target = tmp_path / "Docs" / "a.txt"
+    target.parent.mkdir()
+    ours = write_old(tmp_path / "Docs" / os.path.basename(part_path(str(target), "0123456789abcdef")), "pay")
+    user_file = write_old(tmp_path / "Docs" / ("a.txt" + PART_SUFFIX), "user data")
+    JOURNAL_PATH.write_text(json.dumps({"op": "begin", "id": "0123456789abcdef", "batch_id": None,
+                                        "source": str(source), "target": str(target)}) + "\n")
+
+    journal = MoveJournal()
+    assert journal.acquire()
+    try:
+        assert journal.recover()["rolled_back"] == 1
+    finally:
+        journal.close()
+    assert not ours.exists()
+    assert user_file.read_text() == "user data" and source.exists()
+
+
+def test_move_never_overwrites(tmp_path, write_old):
+    write_old(tmp_path / "a", "new")
+    write_old(tmp_path / "b", "old")
+    with pytest.raises(FileExistsError):
+        MoveEngine().move(tmp_path / "a", tmp_path / "b")
+    assert (tmp_path / "a").read_text() == "new"
+    assert (tmp_path / "b").read_text() == "old"
+
+
+def test_move_file_renames_when_target_appears(tmp_path, write_old, make_organizer):
+    write_old(tmp_path / "f.txt", "ours")
+    org = make_organizer(tmp_path)
+    real_move = org.mover.move
+
+    def racing_move(source, target, **kwargs):
+        # 预留之后、移动之前，外部程序占用了同一个目标名
+        if not Path(target).exists() and Path(target).name == "f.txt":
+            Path(target).write_text("theirs")
+        return real_move(source, target, **kwargs)
+
+    org.mover.move = racing_move
+    assert org._move_file(tmp_path / "f.txt", "Docs") is True
+    assert (tmp_path / "Docs" / "f.txt").read_text() == "theirs"
+    assert (tmp_path / "Docs" / "f_1.txt").read_text() == "ours"
+
+
+def test_concurrent_moves_keep_every_file(tmp_path, write_old, make_organizer):
+    org = make_organizer(tmp_path)
+    sources = []
+    for i in range(8):
+        src_dir = tmp_path / f"in{i}"
+        src_dir.mkdir()
+        write_old(src_dir / "same.txt", str(i))
+        sources.append(src_dir / "same.txt")
+    target_dir = tmp_path / "out"
+    target_dir.mkdir()
+
+    def move(source):
+        target = org.dir_cache.reserve(target_dir, source.name)
+        org._place(source, target)
+
+    threads = [threading.Thread(target=move, args=(s,)) for s in sources]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    contents = sorted(p.read_text() for p in target_dir.iterdir())
+    assert contents == [str(i) for i in range(8)]
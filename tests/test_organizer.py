@@ -0,0 +1,37 @@
+from zenfile.core.history import HistoryManager
+
+
+def test_undo_batch_larger_than_max_records(tmp_path, write_old, make_organizer):
+    count = HistoryManager.MAX_RECORDS + 500
+    for i in range(count):
+        write_old(tmp_path / f"f{i}.txt", str(i))
+    org = make_organizer(tmp_path)
+
+    result = org.run_now()
+    assert result["moved"] == count
+    batch_id = HistoryManager.last_batch_id()
+    assert len(HistoryManager.get_batch(batch_id)) == count
+
+    ok, _ = org.undo_batch(batch_id)
+    assert ok
+    assert len([p for p in tmp_path.iterdir() if p.is_file()]) == count
+    assert not any((tmp_path / "Docs").iterdir())
+
+
+def test_undo_since_restores_later_batches_only(tmp_path, write_old, make_organizer):
+    org = make_organizer(tmp_path)
+    write_old(tmp_path / "early.txt", "1")
+    org.run_now()
+    HistoryManager.flush()
+    with HistoryManager._lock:
+        for rec in HistoryManager.get_batch(HistoryManager.last_batch_id()):
+            rec["time"] = "2000-01-01 00:00:00"
+    write_old(tmp_path / "late1.txt", "2")
+    write_old(tmp_path / "late2.txt", "3")
+    org.run_now()
+
+    ok, _ = org.undo_since("2001-01-01 00:00:00")
+    assert ok
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == ["late1.txt", "late2.txt"]
+    assert [p.name for p in (tmp_path / "Docs").iterdir()] == ["early.txt"]
+    assert len(HistoryManager.load_history()) == 1
@@ -0,0 +1,56 @@
+from zenfile.core.history import HistoryManager
+from zenfile.core.planner import OrganizePlan
+
+
+def test_plan_export_load_apply_round_trip(tmp_path, write_old, make_organizer):
+    watch = tmp_path / "in"
+    (watch / "Docs").mkdir(parents=True)
+    write_old(watch / "Docs" / "a.txt", "already there")
+    for name in ("a.txt", "b.txt", "c.txt", "d.md", ".hidden.txt"):
+        write_old(watch / name, name)
+    org = make_organizer(watch)
+
+    plan = org.plan_run()
+    # 计划阶段不修改文件系统
+    assert sorted(p.name for p in (watch / "Docs").iterdir()) == ["a.txt"]
+    targets = {item["source"]: item["target"] for item in plan.items}
+    assert targets == {str(watch / "a.txt"): str(watch / "Docs" / "a_1.txt"),
+                       str(watch / "b.txt"): str(watch / "Docs" / "b.txt"),
+                       str(watch / "c.txt"): str(watch / "Docs" / "c.txt"),
+                       str(watch / "d.md"): str(watch / "99_其他" / "d.md")}  # 未匹配的进入默认分类
+    assert plan.summary()["renamed"] == 1 and plan.skipped == {"hidden": 1}
+
+    report = tmp_path / "plan.json"
+    plan.export(report)
+    loaded = OrganizePlan.load(report)
+    assert loaded.batch_id == plan.batch_id and loaded.items == plan.items
+
+    write_old(watch / "c.txt", "changed after planning")
+    result = org.apply_plan(loaded)
+    assert result["moved"] == 3 and result["skipped"] == {"changed": 1} and result["errors"] == 0
+    assert (watch / "Docs" / "a_1.txt").read_text() == "a.txt"
+    assert (watch / "Docs" / "a.txt").read_text() == "already there"
+    assert (watch / "c.txt").exists() and (watch / "99_其他" / "d.md").exists()
+
+    # 整批作为一次操作撤销
+    assert len(HistoryManager.get_batch(plan.batch_id)) == 3
+    ok, _ = org.undo_batch(plan.batch_id)
+    assert ok
+    assert (watch / "a.txt").read_text() == "a.txt" and (watch / "b.txt").read_text() == "b.txt"
+    assert (watch / "d.md").exists()
+    assert sorted(p.name for p in (watch / "Docs").iterdir()) == ["a.txt"]
+
+
+def test_apply_renames_when_planned_name_was_taken(tmp_path, write_old, make_organizer):
+    watch = tmp_path / "in"
+    watch.mkdir()
+    write_old(watch / "a.txt", "ours")
+    org = make_organizer(watch)
+    plan = org.plan_run()
+
+    (watch / "Docs").mkdir()
+    write_old(watch / "Docs" / "a.txt", "appeared later")
+    result = org.apply_plan(plan)
+    assert result["moved"] == 1
+    assert (watch / "Docs" / "a.txt").read_text() == "appeared later"
+    assert (watch / "Docs" / "a_1.txt").read_text() == "ours"
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from zenfile.core.readiness import ReadinessChecker, RetryQueue
+
+
+def test_readiness_waits_for_a_stable_signature(tmp_path, write_old):
+    checker = ReadinessChecker(settle_time=60)
+    fresh = tmp_path / "fresh.txt"
+    fresh.write_text("partial")
+    assert checker.check(fresh, "fresh") is False
+    assert checker.check(fresh, "fresh") is True  # 两次观察大小与修改时间一致
+
+    fresh.write_text("partial, still writing")
+    assert checker.check(fresh, "fresh") is False
+    assert checker.check(write_old(tmp_path / "old.txt", "done"), "old") is True
+
+
+def test_retry_backoff_doubles_and_gives_up():
+    fired = []
+    done = threading.Event()
+
+    def callback(key):
+        fired.append((key, time.monotonic()))
+        done.set()
+
+    rq = RetryQueue(callback, base_delay=0.05, max_delay=0.15, max_attempts=4)
+    try:
+        delays = []
+        for _ in range(4):
+            done.clear()
+            start = time.monotonic()
+            assert rq.schedule("k", "k")
+            assert done.wait(2)
+            delays.append(fired[-1][1] - start)
+        assert rq.schedule("k", "k") is False  # 超过最大次数
+        for got, want in zip(delays, (0.05, 0.1, 0.15, 0.15)):
+            assert want - 0.01 <= got < want + 0.5
+    finally:
+        rq.stop()
+
+
+def test_retry_queue_refuses_work_after_stop():
+    fired = []
+    rq = RetryQueue(fired.append, base_delay=0.05)
+    assert rq.schedule("a", "a")
+    rq.stop()
+    assert rq.pending == 0
+    assert rq.schedule("b", "b") is False
+    time.sleep(0.15)
+    assert fired == []
+    assert not [t for t in threading.enumerate() if t.name == "ZenFile-Retry" and t.is_alive()]
+
+
+def test_shutdown_drops_deferred_files(tmp_path, make_organizer):
+    org = make_organizer(tmp_path, ready_settle_time=60, retry_base_delay=0.1)
+    path = tmp_path / "busy.txt"
+    path.write_text("still writing")
+    # 文件在退出排空队列时才被检查到未就绪，之后不应再被重新提交、移动
+    org.submit(str(path))
+    org.shutdown(wait=True)
+    time.sleep(0.5)
+    assert path.exists()
+    assert not (tmp_path / "Docs" / "busy.txt").exists()
+    assert org.unfinished == {str(path)}  # 留给下次启动补扫
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from zenfile.core.rules import PatternSet, RuleMatcher
+from zenfile.utils.config import validate_config
+
+
+def test_pattern_set_overlapping_named_groups():
+    ps = PatternSet([r"re:(?P<y>\d+)a", r"re:(?P<y>\d+)b", "*.txt"])
+    assert ps.first("12a") == 0
+    assert ps.first("12b") == 1
+    assert ps.first("note.TXT") == 2
+    assert ps.first("12c") is None
+
+
+def test_pattern_set_keeps_order_and_backreferences():
+    # 反向引用单独编译，编号不会因合并而错位；顺序仍按配置
+    ps = PatternSet(["*.md", r"re:(x)\1", "re:(?P<p0>q)", "re:(", "x*"])
+    assert ps.first("xx") == 1
+    assert ps.first("xy") == 4
+    assert ps.first("q") == 2
+    assert ps.first("a.md") == 0
+
+
+def test_rule_matcher_with_overlapping_named_groups():
+    matcher = RuleMatcher({"pattern_rules": {r"re:(?P<y>\d+)a": "A", r"re:(?P<y>\d+)b": "B"}})
+    assert matcher.match(Path("12a")) == (False, "A")
+    assert matcher.match(Path("12b")) == (False, "B")
+
+
+def test_validate_config_reports_invalid_regex():
+    errors = validate_config({"pattern_rules": {"re:(": "A"}, "ignore_patterns": ["!re:[", "re:ok"]})
+    assert len(errors) == 2
+    assert validate_config({"pattern_rules": {r"re:(?P<y>\d+)a": "A", r"re:(?P<y>\d+)b": "B"}}) == []
+
+
+def test_glob_is_case_insensitive_and_regex_is_not():
+    ps = PatternSet(["IMG_*.heic", "re:Scan\\d+\\.pdf"])
+    assert ps.first("img_0001.HEIC") == 0
+    assert ps.first("Scan12.pdf") == 1
+    assert ps.first("scan12.pdf") is None
+
+
+def test_ignore_patterns_last_rule_wins_and_negation_overrides_ext():
+    matcher = RuleMatcher({"rules": {"Docs": [".txt"]}, "ignore_exts": [".tmp"],
+                           "ignore_patterns": ["*.txt", "!keep*.txt", "!important.tmp"]})
+    assert matcher.match(Path("a.txt")) == (True, None)
+    assert matcher.match(Path("keep-me.txt")) == (False, "Docs")
+    assert matcher.match(Path("x.tmp")) == (True, None)
+    assert matcher.match(Path("important.tmp")) == (False, RuleMatcher.DEFAULT_FOLDER)
+
+
+def test_rule_priority_pattern_then_keyword_then_extension():
+    matcher = RuleMatcher({"rules": {"Docs": [".pdf"]}, "keyword_rules": {"发票": "Finance"},
+                           "pattern_rules": {"report-*": "Reports"}})
+    assert matcher.match(Path("report-发票.pdf")) == (False, "Reports")
+    assert matcher.match(Path("三月发票.pdf")) == (False, "Finance")
+    assert matcher.match(Path("manual.pdf")) == (False, "Docs")
+    assert matcher.match_many([Path("manual.pdf"), Path("x.bin")]) == \
+        [(False, "Docs"), (False, RuleMatcher.DEFAULT_FOLDER)]
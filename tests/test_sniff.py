@@ -0,0 +1,29 @@
+import os
+
+from zenfile.core.sniff import ContentSniffer, detect
+
+
+def test_detect_common_signatures():
+    assert detect(b"%PDF-1.7") == "document"
+    assert detect(b"\x89PNG\r\n\x1a\n" + b"\0" * 8) == "image"
+    assert detect(b"PK\x03\x04" + b"\0" * 26 + b"word/document.xml") == "document"
+    assert detect(b"PK\x03\x04" + b"\0" * 26 + b"data.bin") == "archive"
+    assert detect(b"plain text") is None
+
+
+def test_cache_key_includes_path_when_inode_is_zero(tmp_path):
+    pdf, png = tmp_path / "a", tmp_path / "b"
+    pdf.write_bytes(b"%PDF-1.7")
+    png.write_bytes(b"\x89PNG\r\n\x1a\n")
+    for p in (pdf, png):
+        os.utime(p, ns=(10**18, 10**18))
+
+    def windows_stat(path):
+        # 模拟 Windows 下 DirEntry.stat()：st_ino 与 st_dev 为 0
+        st = list(os.stat(path))
+        st[1] = st[2] = 0
+        return os.stat_result(st + [0, 0, 0])
+
+    sniffer = ContentSniffer()
+    assert sniffer.sniff(pdf, windows_stat(pdf)) == "document"
+    assert sniffer.sniff(png, windows_stat(png)) == "image"
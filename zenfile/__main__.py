@@ -0,0 +1,7 @@
+import sys
+import multiprocessing
+from zenfile.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 进程池 (重复检测) 需要
+    sys.exit(main())
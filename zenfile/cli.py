@@ -0,0 +1,113 @@
+"""
+ZenFile 无界面入口：只启动 Organizer 与 MonitorManager，不加载 tkinter / 托盘 / 热键 / 注册表模块，
+适用于 Linux 文件服务器等没有桌面环境的场合
+
+    python -m zenfile                 # 后台监控，Ctrl+C 或 SIGTERM 退出
+    python -m zenfile --once          # 整理一次后退出
+    python -m zenfile --dir D:/Inbox  # 临时指定监控目录 (可重复，覆盖配置中的 watch_dirs)
+    python -m zenfile --dry-run --report plan.json   # 只生成整理计划 (.json / .csv)
+    python -m zenfile --apply-plan plan.json         # 执行之前导出的计划
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import signal
+import threading
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="zenfile", description="ZenFile 无界面模式")
+    parser.add_argument("--once", action="store_true", help="对监控目录整理一次后退出")
+    parser.add_argument("--dir", dest="dirs", action="append", metavar="PATH",
+                        help="监控目录，可多次指定；不指定时使用配置文件")
+    parser.add_argument("--dry-run", action="store_true", help="只计算整理计划，不移动文件")
+    parser.add_argument("--report", metavar="FILE", help="整理计划导出路径 (.json 或 .csv)")
+    parser.add_argument("--apply-plan", metavar="FILE", help="执行 --dry-run 导出的 JSON 计划后退出")
+    return parser
+
+
+def _wait_idle(organizer, interval=0.2):
+    """等待重试队列中尚未就绪的文件处理完 (连续两次检查都空闲才返回)"""
+    idle = 0
+    while idle < 2:
+        time.sleep(interval)
+        busy = organizer.retry_queue.pending or organizer.executor.depth
+        idle = 0 if busy else idle + 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # 核心模块在此导入，便于统计导入耗时
+    t = time.perf_counter()
+    from zenfile.utils.config import load_config
+    from zenfile.utils.logger import setup_logger, shutdown_logger
+    from zenfile.core.organizer import Organizer
+    from zenfile.core.monitor import MonitorManager
+    from zenfile.core.history import HistoryManager
+    from zenfile.core.reloader import ConfigReloader
+    from zenfile.utils.metrics import MetricsExporter
+    import_ms = (time.perf_counter() - t) * 1000
+
+    config = load_config()
+    logger = setup_logger(config)
+    if args.dirs:
+        config = dict(config, watch_dirs=args.dirs)
+    logger.info(f">>> ZenFile 启动 (无界面模式)，模块导入耗时 {import_ms:.0f} ms")
+
+    organizer = Organizer(config, logger, dry_run=args.dry_run and not args.apply_plan)
+    metrics_exporter = MetricsExporter(config, logger).start()
+
+    if args.dry_run or args.apply_plan:
+        if args.apply_plan:
+            from zenfile.core.planner import OrganizePlan
+            organizer.apply_plan(OrganizePlan.load(args.apply_plan))
+        else:
+            plan = organizer.plan_run()
+            if args.report:
+                plan.export(args.report)
+                logger.info(f"整理计划已导出: {args.report}")
+            else:
+                for item in plan.items:
+                    print(f"{item['source']} -> {item['target']}")
+        organizer.shutdown(wait=True)
+        metrics_exporter.stop()
+        HistoryManager.flush()
+        shutdown_logger()
+        return 0
+
+    if args.once:
+        organizer.run_now()
+        _wait_idle(organizer)
+        organizer.shutdown(wait=True)
+        metrics_exporter.stop()
+        HistoryManager.flush()
+        logger.info(f"退出，总耗时 {time.perf_counter() - _START:.2f} 秒 (未就绪的文件已在重试后处理)")
+        shutdown_logger()
+        return 0
+
+    monitor_manager = MonitorManager(organizer, logger)
+    monitor_manager.start(config.get("watch_dirs", []))
+    # 用 --dir 临时指定目录时不跟随配置文件变化
+    config_reloader = ConfigReloader(organizer, monitor_manager, logger)
+    if config.get("config_hot_reload", True) and not args.dirs:
+        config_reloader.start()
+    logger.info(f"监控就绪，启动耗时 {(time.perf_counter() - _START) * 1000:.0f} ms")
+
+    stop = threading.Event()
+    for name in ("SIGINT", "SIGTERM"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda *_: stop.set())
+    # 带超时等待，Windows 下 Ctrl+C 也能及时响应
+    while not stop.wait(1):
+        pass
+
+    logger.info("正在退出...")
+    config_reloader.stop()
+    monitor_manager.stop()
+    metrics_exporter.stop()
+    HistoryManager.flush()
+    shutdown_logger()
+    return 0
@@ -0,0 +1,116 @@
+import heapq
+import time
+import threading
+from zenfile.utils.metrics import metrics
+
+
+class EventCoalescer:
+    """
+    事件合并器：按路径合并文件事件
+    同一路径在静默窗口 (quiet_window) 内反复触发时只计时不处理，
+    直到该路径安静下来才调用一次 callback(path)
+    """
+
+    def __init__(self, callback, quiet_window=1.0, logger=None):
+        self.callback = callback
+        self.quiet_window = quiet_window
+        self.logger = logger
+
+        self._pending = {}  # path -> [截止时间, 事件数, 首个事件时间]
+        self._heap = []     # (截止时间, path)，过期条目惰性丢弃
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # 统计
+        self.received = 0
+        self.emitted = 0
+
+    @property
+    def collapsed(self):
+        """被合并掉的事件数"""
+        return self.received - self.emitted - len(self._pending)
+
+    def start(self):
+        with self._cond:
+            if self._running: return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="ZenFile-Coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        with self._cond:
+            if not self._running: return
+            self._running = False
+            pending = [(p, e[2]) for p, e in self._pending.items()] if flush else []
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for path, first in pending:
+            self._emit(path, first)
+
+    def submit(self, path):
+        now = time.monotonic()
+        deadline = now + self.quiet_window
+        with self._cond:
+            self.received += 1
+            entry = self._pending.get(path)
+            if entry:
+                entry[0] = deadline
+                entry[1] += 1
+            else:
+                self._pending[path] = [deadline, 1, now]
+            heapq.heappush(self._heap, (deadline, path))
+            self._cond.notify()
+
+    def discard(self, path):
+        """路径已被移走/删除时取消待处理事件"""
+        # 被取消的事件不会触发处理，自然计入 collapsed
+        with self._cond:
+            self._pending.pop(path, None)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "received": self.received,
+                "emitted": self.emitted,
+                "collapsed": self.collapsed,
+                "pending": len(self._pending),
+            }
+
+    def _loop(self):
+        while True:
+            ready = []
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    while self._heap and self._heap[0][0] <= now:
+                        deadline, path = heapq.heappop(self._heap)
+                        entry = self._pending.get(path)
+                        # 只有最新的截止时间才有效
+                        if entry and entry[0] == deadline:
+                            del self._pending[path]
+                            ready.append((path, entry[2]))
+                    if ready:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running and not ready:
+                    return
+            for path, first in ready:
+                self._emit(path, first)
+
+    def _emit(self, path, first=None):
+        with self._cond:
+            self.emitted += 1
+        if first is not None:
+            # 首个事件到交给工作队列的延迟 (含静默窗口)
+            metrics.observe("stage_seconds", time.monotonic() - first, {"stage": "coalesce"})
+        try:
+            self.callback(path)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"事件处理出错 {path}: {e}")
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from zenfile.utils.config import HASH_CACHE_PATH, DUPLICATES_PATH
+
+PARTIAL_BLOCK = 64 * 1024       # 部分哈希：头尾各取 64KB
+INLINE_LIMIT = 1024 * 1024      # 小于该大小的文件直接在当前线程计算
+_CHUNK = 1024 * 1024
+
+
+def partial_hash(path, size):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size <= PARTIAL_BLOCK * 2:
+            h.update(f.read())
+        else:
+            h.update(f.read(PARTIAL_BLOCK))
+            f.seek(-PARTIAL_BLOCK, os.SEEK_END)
+            h.update(f.read(PARTIAL_BLOCK))
+    return h.hexdigest()
+
+
+def full_hash(path, size=None):
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DuplicateDetector:
+    """
+    重复文件检测 (目标文件名冲突时调用)
+    1. 比较大小
+    2. 比较头尾部分哈希
+    3. 比较完整哈希
+    大文件的哈希在进程池中计算；结果按 (路径, 大小, 修改时间) 持久化缓存
+    """
+
+    MAX_CACHE = 20000
+    SAVE_EVERY = 200
+
+    def __init__(self, workers=2, logger=None):
+        self.workers = workers
+        self.logger = logger
+        self._pool = None
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+        self._dirty = 0
+        self._recorded = None  # 已记录的 (文件, 原文件)，首次记录时从 duplicates.jsonl 读取
+
+    # ---------- 缓存 ----------
+    @staticmethod
+    def _load_cache():
+        if not HASH_CACHE_PATH.exists():
+            return {}
+        try:
+            with open(HASH_CACHE_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            cache = dict(self._cache)
+            self._dirty = 0
+        tmp = HASH_CACHE_PATH.with_suffix(".json.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp, HASH_CACHE_PATH)
+        except Exception as e:
+            if self.logger: self.logger.error(f"保存哈希缓存失败: {e}")
+
+    def close(self):
+        self.save()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _hash(self, kind, path, st):
+        key = f"{path}|{st.st_size}|{st.st_mtime_ns}"
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and kind in entry:
+                return entry[kind]
+
+        func = partial_hash if kind == "partial" else full_hash
+        if st.st_size < INLINE_LIMIT:
+            digest = func(path, st.st_size)
+        else:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                pool = self._pool
+            digest = pool.submit(func, path, st.st_size).result()
+
+        save = False
+        with self._lock:
+            self._cache.setdefault(key, {})[kind] = digest
+            if len(self._cache) > self.MAX_CACHE:
+                # dict 保持插入顺序，丢弃最早的条目
+                for old in list(self._cache)[:len(self._cache) - self.MAX_CACHE]:
+                    del self._cache[old]
+            self._dirty += 1
+            save = self._dirty >= self.SAVE_EVERY
+        if save: self.save()
+        return digest
+
+    # ---------- 检测 ----------
+    def is_duplicate(self, source, existing, src_st=None):
+        try:
+            src_st = src_st or os.stat(source)
+            ex_st = os.stat(existing)
+        except OSError:
+            return False
+        if src_st.st_size != ex_st.st_size:
+            return False
+        if src_st.st_size == 0:
+            return True
+        source, existing = str(source), str(existing)
+        if self._hash("partial", source, src_st) != self._hash("partial", existing, ex_st):
+            return False
+        if src_st.st_size <= PARTIAL_BLOCK * 2:
+            return True  # 部分哈希已覆盖整个文件
+        return self._hash("full", source, src_st) == self._hash("full", existing, ex_st)
+
+    def record(self, source, existing):
+        """记录重复文件到 duplicates.jsonl；同一对 (文件, 原文件) 只记录一次，重复扫描不会反复追加"""
+        key = (str(source), str(existing))
+        with self._lock:
+            if self._recorded is None:
+                self._recorded = self._load_recorded()
+            if key in self._recorded: return False
+            self._recorded.add(key)
+            item = {
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "source": key[0],
+                "duplicate_of": key[1],
+            }
+            try:
+                with open(DUPLICATES_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            except Exception as e:
+                self._recorded.discard(key)
+                if self.logger: self.logger.error(f"记录重复文件失败: {e}")
+                return False
+        return True
+
+    @staticmethod
+    def _load_recorded():
+        recorded = set()
+        if not DUPLICATES_PATH.exists():
+            return recorded
+        try:
+            with open(DUPLICATES_PATH, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    recorded.add((item.get("source"), item.get("duplicate_of")))
+        except Exception:
+            pass
+        return recorded
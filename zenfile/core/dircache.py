@@ -0,0 +1,130 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+
+def _norm(name):
+    # Windows 文件名不区分大小写
+    return name.lower() if sys.platform == 'win32' else name
+
+
+class DirectoryCache:
+    """
+    目标目录状态缓存
+    - 已确认存在的目标目录，避免每个文件都 mkdir
+    - 每个目标目录的文件名索引与各文件名的下一个可用序号，
+      冲突时直接给出 name_N，无需逐个 exists 探测
+    - 所有预留在同一把锁下完成，并发工作线程不会拿到同一个目标名
+    - 已预留但尚未移动完成的文件名单独记录，重建目录索引时保留，
+      移动成功后 commit，失败时 release
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._known_dirs = set()
+        self._names = {}     # 目录 -> 已占用文件名集合
+        self._counters = {}  # (目录, stem, suffix) -> 下一个尝试的序号
+        self._pending = {}   # 目录 -> 已预留、尚未落地的文件名集合 (不随 invalidate 丢弃)
+
+    def ensure_dir(self, path):
+        key = _norm(str(path))
+        with self._lock:
+            if key in self._known_dirs: return
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._known_dirs.add(key)
+
+    def _load_names(self, dir_key, path):
+        names = self._names.get(dir_key)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        names.add(_norm(entry.name))
+            except FileNotFoundError:
+                pass
+            names |= self._pending.get(dir_key, set())
+            self._names[dir_key] = names
+        return names
+
+    def reserve(self, target_dir, source_name):
+        """为 source_name 在 target_dir 中预留一个不冲突的文件名，返回目标路径"""
+        stem, suffix = os.path.splitext(source_name)
+        dir_key = _norm(str(target_dir))
+        with self._lock:
+            names = self._load_names(dir_key, target_dir)
+            key = _norm(source_name)
+            if key not in names:
+                names.add(key)
+                self._pending.setdefault(dir_key, set()).add(key)
+                return target_dir / source_name
+
+            counter_key = (dir_key, _norm(stem), _norm(suffix))
+            counter = self._counters.get(counter_key, 1)
+            while True:
+                candidate = f"{stem}_{counter}{suffix}"
+                counter += 1
+                if _norm(candidate) not in names:
+                    break
+            names.add(_norm(candidate))
+            self._pending.setdefault(dir_key, set()).add(_norm(candidate))
+            self._counters[counter_key] = counter
+            return target_dir / candidate
+
+    def claim(self, target):
+        """尝试预留指定的文件名 (如计划中已确定的目标)，已被占用时返回 False"""
+        target = Path(target)
+        dir_key = _norm(str(target.parent))
+        key = _norm(target.name)
+        with self._lock:
+            names = self._load_names(dir_key, target.parent)
+            if key in names: return False
+            names.add(key)
+            self._pending.setdefault(dir_key, set()).add(key)
+            return True
+
+    def _drop_pending(self, dir_key, name):
+        pending = self._pending.get(dir_key)
+        if pending is not None:
+            pending.discard(name)
+            if not pending:
+                del self._pending[dir_key]
+
+    def commit(self, target):
+        """文件已移动到预留的名称：此后由目录中的实际文件占用该名"""
+        target = Path(target)
+        with self._lock:
+            self._drop_pending(_norm(str(target.parent)), _norm(target.name))
+
+    def release(self, target):
+        """移动失败或文件被移出时归还文件名"""
+        target = Path(target)
+        dir_key = _norm(str(target.parent))
+        name = _norm(target.name)
+        with self._lock:
+            self._drop_pending(dir_key, name)
+            names = self._names.get(dir_key)
+            if names is not None:
+                names.discard(name)
+
+    def invalidate(self, path=None):
+        """目录发生外部变化时丢弃相关缓存；path 为 None 时全部清空 (进行中的预留保留，重建索引时并入)"""
+        with self._lock:
+            if path is None:
+                self._known_dirs.clear()
+                self._names.clear()
+                self._counters.clear()
+                return
+            prefix = _norm(str(path))
+            sep_prefix = prefix.rstrip("\\/") + os.sep
+
+            def hit(k):
+                return k == prefix or k.startswith(sep_prefix)
+
+            self._known_dirs = {k for k in self._known_dirs if not hit(k)}
+            for k in [k for k in self._names if hit(k)]:
+                del self._names[k]
+            for k in [k for k in self._counters if hit(k[0])]:
+                del self._counters[k]
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from zenfile.utils.metrics import metrics
+
+_STOP = object()
+
+
+class TaskExecutor:
+    """
+    有界工作队列 + 固定线程池
+    - 队列满时 submit 阻塞 (背压)，避免事件风暴撑爆内存
+    - 同一 key (文件路径) 同时只会被一个工作线程处理；
+      处理期间再次提交的任务会在当前任务结束后由同一线程补跑一次
+    - shutdown(wait=True) 会处理完队列中已有任务再退出；关闭后不再接受新任务 (不能重新启动)
+    """
+
+    def __init__(self, handler, workers=4, queue_size=1000, logger=None, name="ZenFile-Worker"):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.logger = logger
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock()
+        self._active = set()   # 已排队或正在处理的 key
+        self._rerun = {}       # key -> 处理期间新提交的参数
+        self._threads = []
+        self._accepting = True
+
+    @property
+    def depth(self):
+        """当前排队中的任务数"""
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        if self._threads: return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key, *args, timeout=None):
+        """提交任务；队列满时阻塞，超时或已关闭返回 False"""
+        with self._lock:
+            if not self._accepting:
+                return False
+            self._ensure_started()
+            if key in self._active:
+                self._rerun[key] = args
+                return True
+            self._active.add(key)
+        try:
+            self._queue.put((key, args, time.monotonic()), timeout=timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._active.discard(key)
+            return False
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if not self._accepting: return
+            self._accepting = False
+            threads = self._threads
+            self._threads = []
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                key, args, queued_at = item
+                metrics.observe("stage_seconds", time.monotonic() - queued_at, {"stage": "queue"})
+                while True:
+                    try:
+                        self.handler(*args)
+                    except Exception as e:
+                        if self.logger:
+                            self.logger.error(f"任务执行出错 {key}: {e}")
+                    with self._lock:
+                        if key in self._rerun:
+                            args = self._rerun.pop(key)
+                            continue
+                        self._active.discard(key)
+                        break
+            finally:
+                self._queue.task_done()
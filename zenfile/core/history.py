@@ -1,70 +1,396 @@
 import json
+import logging
+import os
 import uuid
+from itertools import islice
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from zenfile.utils.config import HISTORY_PATH
+from zenfile.utils.config import HISTORY_PATH, LEGACY_HISTORY_PATH
+from zenfile.utils.metrics import metrics
+
+logger = logging.getLogger("ZenFile")
 
 
 class HistoryManager:
-    _lock = threading.Lock()
+    """
+    追加式历史日志 (JSON Lines)
+    - 每条记录一行，撤销时追加 {"op": "undo", "ids": [...]} 墓碑行
+    - 写入先进入内存缓冲，按批次/定时统一落盘 (group commit)
+    - 日志行数超过阈值时整体压缩；超过 MAX_RECORDS 条时按整批淘汰最早的批次，
+      最近 KEEP_BATCHES 个批次与进行中的批次 (live_batch) 不淘汰，大批次可完整撤销
+    - 内存中按 id 与 batch_id 建索引，可撤销任意批次或某时间点之后的全部记录
+    """
+    _lock = threading.RLock()
+
+    MAX_RECORDS = 1000       # 保留的历史条数 (软上限，可由配置 history_max_records 修改)
+    KEEP_BATCHES = 20        # 无论条数多少，始终保留最近的批次数
+    FLUSH_BATCH = 200        # 缓冲达到该条数立即落盘
+    FLUSH_INTERVAL = 0.5     # 否则最多延迟多少秒落盘
+    RETRY_INTERVAL = 5.0     # 写入失败后隔多久重试
+    COMPACT_LINES = 3000     # 日志行数超过该值时压缩
+
+    _records = None          # id -> 记录 (按时间顺序)
+    _batches = None          # 批次键 -> {id: None} (有序)；无 batch_id 的记录以自身 id 为键
+    _pending = []            # 待写入的行
+    _journal_lines = 0       # 当前日志文件行数
+    _flush_timer = None
+    _write_failed = False    # 上次写入是否失败 (失败期间只记录一次错误)
+    _torn = False            # 文件末尾是否可能是写了一半的行
+    _load_failed = False     # 加载时读取出错 (不压缩)
+    _live = {}               # 进行中的批次键 -> 引用计数
 
+    # ---------- 内部工具 ----------
     @staticmethod
-    def load_history():
-        if not HISTORY_PATH.exists():
-            return []
+    def _ensure_loaded():
+        if HistoryManager._records is not None:
+            return
+        records, lines = [], 0
+        HistoryManager._torn = HistoryManager._load_failed = False
+        if HISTORY_PATH.exists():
+            removed, raw = set(), b"\n"
+            try:
+                # 按字节读取、逐行解码：崩溃时写了一半的行可能断在多字节字符中间，只跳过这一行
+                with open(HISTORY_PATH, "rb") as f:
+                    for raw in f:
+                        line = raw.strip()
+                        if not line:
+                            continue
+                        lines += 1
+                        try:
+                            item = json.loads(line.decode("utf-8"))
+                        except ValueError:
+                            continue  # 崩溃时写了一半的行
+                        if item.get("op") == "undo":
+                            removed.update(item.get("ids", []))
+                        else:
+                            records.append(item)
+            except OSError as e:
+                # 读取不完整：之后不压缩，避免用残缺的记录覆盖文件
+                HistoryManager._load_failed = True
+                logger.error(f"读取历史失败: {e}")
+            # 文件不以换行结尾：下次追加先换行，新记录不会接在残行后面
+            HistoryManager._torn = not raw.endswith(b"\n")
+            if removed:
+                records = [r for r in records if r.get("id") not in removed]
+        elif LEGACY_HISTORY_PATH.exists():
+            # 迁移旧版 history.json
+            try:
+                with open(LEGACY_HISTORY_PATH, "r", encoding="utf-8") as f:
+                    records = json.load(f)
+            except Exception:
+                records = []
+
+        HistoryManager._records = OrderedDict()
+        HistoryManager._batches = OrderedDict()
+        for rec in records:
+            HistoryManager._index(rec)
+        HistoryManager._trim()
+        HistoryManager._journal_lines = lines
+        if not HISTORY_PATH.exists() and HistoryManager._records:
+            HistoryManager._compact()
+            try:
+                LEGACY_HISTORY_PATH.replace(LEGACY_HISTORY_PATH.with_suffix(".json.bak"))
+            except OSError:
+                pass
+
+    @staticmethod
+    def batch_key(record):
+        return record.get("batch_id") or record.get("id")
+
+    @staticmethod
+    def _index(record):
+        record_id = record.setdefault("id", str(uuid.uuid4()))
+        HistoryManager._records[record_id] = record
+        HistoryManager._batches.setdefault(HistoryManager.batch_key(record), {})[record_id] = None
+
+    @staticmethod
+    def category_of(record):
+        """记录的分类文件夹；旧记录没有 category 字段时由源目录与目标目录推算"""
+        category = record.get("category")
+        if category is None:
+            try:
+                category = os.path.relpath(os.path.dirname(record["target"]), os.path.dirname(record["source"]))
+            except (KeyError, ValueError):
+                category = ""
+            category = category.replace("\\", "/")
+        return category
+
+    @staticmethod
+    def _unindex(record_id):
+        record = HistoryManager._records.pop(record_id, None)
+        if record is None: return None
+        key = HistoryManager.batch_key(record)
+        ids = HistoryManager._batches.get(key)
+        if ids is not None:
+            ids.pop(record_id, None)
+            if not ids:
+                del HistoryManager._batches[key]
+        return record
+
+    @staticmethod
+    def _trim():
+        """按整批淘汰最早的批次，直到条数不超过 MAX_RECORDS 或只剩受保护的批次"""
+        records, batches = HistoryManager._records, HistoryManager._batches
+        if len(records) <= HistoryManager.MAX_RECORDS: return
+        protected = set(islice(reversed(batches), HistoryManager.KEEP_BATCHES))
+        protected.update(HistoryManager._live)
+        for key in list(batches):
+            if len(records) <= HistoryManager.MAX_RECORDS: break
+            if key in protected: continue
+            for record_id in list(batches[key]):
+                HistoryManager._unindex(record_id)
+
+    @staticmethod
+    def _append(item):
+        HistoryManager._pending.append(json.dumps(item, ensure_ascii=False))
+        if len(HistoryManager._pending) >= HistoryManager.FLUSH_BATCH and not HistoryManager._write_failed:
+            HistoryManager._flush_locked()
+        elif HistoryManager._flush_timer is None:
+            HistoryManager._schedule_flush(HistoryManager.FLUSH_INTERVAL)
+
+    @staticmethod
+    def _schedule_flush(delay):
+        timer = threading.Timer(delay, HistoryManager.flush)
+        timer.daemon = True
+        HistoryManager._flush_timer = timer
+        timer.start()
+
+    @staticmethod
+    def _flush_locked():
+        if HistoryManager._flush_timer is not None:
+            HistoryManager._flush_timer.cancel()
+            HistoryManager._flush_timer = None
+        if not HistoryManager._pending:
+            return
+        lines = HistoryManager._pending
+        HistoryManager._pending = []
         try:
-            with open(HISTORY_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return []
+            with metrics.stage("history_flush"):
+                with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+                    # 上次失败或崩溃可能留下写了一半的行，先换行隔开 (空行读取时会跳过)
+                    torn = HistoryManager._write_failed or HistoryManager._torn
+                    f.write(("\n" if torn else "") + "\n".join(lines) + "\n")
+            HistoryManager._journal_lines += len(lines)
+            HistoryManager._torn = False
+        except Exception as e:
+            # 写入失败：放回缓冲区等待重试，is_flushed() 在写入成功前保持 False
+            HistoryManager._pending = lines + HistoryManager._pending
+            metrics.inc("errors", {"stage": "history"})
+            if not HistoryManager._write_failed:
+                logger.error(f"保存历史失败，{HistoryManager.RETRY_INTERVAL:.0f} 秒后重试: {e}")
+            HistoryManager._write_failed = True
+            HistoryManager._schedule_flush(HistoryManager.RETRY_INTERVAL)
+            return
+        if HistoryManager._write_failed:
+            HistoryManager._write_failed = False
+            logger.info("历史记录已恢复写入")
+        # 保留的记录本身很多时 (大批次) 按比例放宽阈值，避免每次落盘都重写整个文件
+        if HistoryManager._journal_lines > max(HistoryManager.COMPACT_LINES, 3 * len(HistoryManager._records)):
+            HistoryManager._compact()
+
+    @staticmethod
+    def _compact():
+        """将有效记录重写为新日志并原子替换"""
+        if HistoryManager._load_failed: return
+        HistoryManager._trim()
+        records = list(HistoryManager._records.values())
+        tmp_path = HISTORY_PATH.with_suffix(".jsonl.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, HISTORY_PATH)
+            HistoryManager._journal_lines = len(records)
+            HistoryManager._torn = False
+        except Exception as e:
+            logger.error(f"压缩历史失败: {e}")
+
+    # ---------- 公共接口 ----------
+    @staticmethod
+    def load_history():
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            HistoryManager._trim()
+            return list(HistoryManager._records.values())
 
     load = load_history
 
     @staticmethod
-    def save_history(history):
-        if len(history) > 1000:
-            history = history[-1000:]
+    def configure(max_records=None):
+        with HistoryManager._lock:
+            if max_records:
+                HistoryManager.MAX_RECORDS = int(max_records)
+
+    @staticmethod
+    @contextmanager
+    def live_batch(batch_id):
+        """批次写入期间 (如一键整理) 标记为进行中，其中的记录不会被淘汰"""
+        with HistoryManager._lock:
+            HistoryManager._live[batch_id] = HistoryManager._live.get(batch_id, 0) + 1
         try:
-            with open(HISTORY_PATH, "w", encoding="utf-8") as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存历史失败: {e}")
+            yield
+        finally:
+            with HistoryManager._lock:
+                n = HistoryManager._live.pop(batch_id, 1) - 1
+                if n > 0:
+                    HistoryManager._live[batch_id] = n
 
     @staticmethod
-    def add_record(source, target, batch_id=None):
+    def flush():
+        """立即落盘缓冲中的记录 (退出前调用)"""
         with HistoryManager._lock:
+            HistoryManager._flush_locked()
+
+    @staticmethod
+    def add_record(source, target, batch_id=None, category=None):
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
             record = {
                 "id": str(uuid.uuid4()),
                 "batch_id": batch_id,
                 "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "source": str(source),
-                "target": str(target)
+                "target": str(target),
+                "category": category
             }
-            history = HistoryManager.load_history()
-            history.append(record)
-            HistoryManager.save_history(history)
+            HistoryManager._index(record)
+            HistoryManager._trim()
+            HistoryManager._append(record)
 
     @staticmethod
-    def pop_last_batch():
+    def add_records(pairs, batch_id=None):
+        """批量添加 [(source, target) 或 (source, target, category), ...]，整批只写一次文件"""
         with HistoryManager._lock:
-            history = HistoryManager.load_history()
-            if not history:
-                return []
+            HistoryManager._ensure_loaded()
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for source, target, *rest in pairs:
+                record = {
+                    "id": str(uuid.uuid4()),
+                    "batch_id": batch_id,
+                    "time": now,
+                    "source": str(source),
+                    "target": str(target),
+                    "category": rest[0] if rest else None
+                }
+                HistoryManager._index(record)
+                HistoryManager._pending.append(json.dumps(record, ensure_ascii=False))
+            HistoryManager._trim()
+            HistoryManager._flush_locked()
+
+    @staticmethod
+    def is_flushed():
+        """缓冲中的记录是否都已写入文件"""
+        with HistoryManager._lock:
+            return not HistoryManager._pending
+
+    @staticmethod
+    def has_record(source, target):
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            source, target = str(source), str(target)
+            return any(r["target"] == target and r["source"] == source
+                       for r in HistoryManager._records.values())
 
-            last_record = history[-1]
-            last_batch_id = last_record.get("batch_id")
+    @staticmethod
+    def last_batch_id():
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            if not HistoryManager._records: return None
+            return HistoryManager.batch_key(next(reversed(HistoryManager._records.values())))
 
-            if not last_batch_id:
-                history.pop()
-                HistoryManager.save_history(history)
-                return [last_record]
+    @staticmethod
+    def list_batches():
+        """返回所有批次概要 (最新在前): [{"batch_id", "time", "count"}]"""
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            result = []
+            for key in reversed(HistoryManager._batches):
+                ids = HistoryManager._batches[key]
+                last = HistoryManager._records[next(reversed(ids))]
+                result.append({"batch_id": key, "time": last.get("time"), "count": len(ids)})
+            return result
+
+    @staticmethod
+    def get_batch(batch_id):
+        """返回某批次的全部记录 (按时间顺序)"""
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            ids = HistoryManager._batches.get(batch_id, [])
+            return [HistoryManager._records[i] for i in ids]
 
-            batch_records = []
-            while history:
-                if history[-1].get("batch_id") == last_batch_id:
-                    batch_records.append(history.pop())
-                else:
+    @staticmethod
+    def records_since(timestamp):
+        """返回 timestamp 及之后的全部记录 (按时间顺序)；timestamp 可为 datetime 或 "%Y-%m-%d %H:%M:%S" 字符串"""
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            result = []
+            # 记录按时间追加，从尾部倒序扫描到早于 timestamp 即可停止
+            for rec in reversed(HistoryManager._records.values()):
+                if rec.get("time", "") < timestamp:
                     break
+                result.append(rec)
+            result.reverse()
+            return result
+
+    @staticmethod
+    def query(page=0, page_size=50, category=None, since=None, until=None):
+        """
+        分页查询 (最新在前)，返回第 page 页 (从 0 开始) 的记录列表，不足 page_size 条表示没有更多
+        category: 只返回该分类；since/until: 时间范围 (含两端)，可为 datetime 或 "%Y-%m-%d %H:%M:%S" 字符串
+        从内存索引尾部倒序扫描，取满一页或早于 since 即停止，不读取文件
+        """
+        if isinstance(since, datetime):
+            since = since.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(until, datetime):
+            until = until.strftime("%Y-%m-%d %H:%M:%S")
+
+        def matches(records):
+            for rec in records:
+                t = rec.get("time", "")
+                if since and t < since:
+                    return  # 记录按时间追加，之后的都更早
+                if until and t > until:
+                    continue
+                if category is not None and HistoryManager.category_of(rec) != category:
+                    continue
+                yield rec
 
-            HistoryManager.save_history(history)
-            return batch_records
\ No newline at end of file
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            start = max(0, page) * page_size
+            return list(islice(matches(reversed(HistoryManager._records.values())), start, start + page_size))
+
+    @staticmethod
+    def categories():
+        """历史记录中出现过的分类 (按名称排序)，供界面筛选"""
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            return sorted({HistoryManager.category_of(r) for r in HistoryManager._records.values()})
+
+    @staticmethod
+    def remove_records(ids):
+        """删除指定记录 (追加墓碑行)，返回实际删除的条数"""
+        with HistoryManager._lock:
+            HistoryManager._ensure_loaded()
+            removed = [i for i in ids if HistoryManager._unindex(i) is not None]
+            if removed:
+                HistoryManager._append({"op": "undo", "ids": removed})
+                HistoryManager._flush_locked()
+            return len(removed)
+
+    @staticmethod
+    def pop_last_batch():
+        with HistoryManager._lock:
+            batch_id = HistoryManager.last_batch_id()
+            if batch_id is None:
+                return []
+            batch_records = HistoryManager.get_batch(batch_id)
+            HistoryManager.remove_records([r["id"] for r in batch_records])
+            batch_records.reverse()
+            return batch_records
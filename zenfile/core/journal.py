@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+import uuid
+from .dedup import full_hash
+from .history import HistoryManager
+from .mover import part_path
+from zenfile.utils.config import JOURNAL_PATH
+
+
+def _try_lock(fh):
+    """对已打开的文件加非阻塞独占锁，已被其他进程持有时返回 False (进程退出时系统自动释放)"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class MoveJournal:
+    """
+    移动预写日志 (JSON Lines)
+    - 每次移动前写入 begin 意图，完成后写 done，放弃时写 abort
+    - begin 采用组提交：并发线程的意图合并为一次写入，调用方等到意图写入后再移动；
+      写入后即可承受进程被杀，fsync=True 时再 fsync 一次以承受断电 (同样按组，不是每个文件一次)
+    - done/abort 不单独写入，等历史记录已落盘后随下一次提交顺带写入，
+      保证日志中标记完成的移动在历史中一定有记录 (未写入的由恢复流程核对历史)
+    - 启动时 recover() 处理上次未完成的意图：补完或回滚，并清空日志
+    - 日志由一个进程独占：acquire() 取得锁文件后才写入与恢复；
+      其他进程 (或未取得锁时) 不写日志、不恢复，避免删掉正在运行的进程的临时文件或清空其日志
+    """
+
+    COMPACT_LINES = 1000
+
+    def __init__(self, path=JOURNAL_PATH, logger=None, fsync=False):
+        self.path = path
+        self.logger = logger
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._buffer = []     # 待写入的行
+        self._seq = 0         # 已追加到缓冲区的行号
+        self._synced = 0      # 已落盘的行号
+        self._flushing = False
+        self._finished = []   # 等待写入的 done/abort 行
+        self._open = set()    # 尚未完成的意图
+        self._lines = 0       # 日志文件当前行数
+        self._torn = False    # 日志文件末尾是否为写了一半的行 (下次写入先换行)
+        self._fh = None
+        self._lock_fh = None
+        self.enabled = False  # 取得锁后才启用
+
+    def acquire(self):
+        """取得日志的独占锁，返回是否成功"""
+        if self._lock_fh is not None: return True
+        fh = None
+        try:
+            fh = open(self.path.with_suffix(".lock"), "a+")
+            if _try_lock(fh):
+                self._lock_fh, self.enabled = fh, True
+                return True
+        except OSError as e:
+            if self.logger: self.logger.error(f"无法打开移动日志锁文件: {e}")
+        if fh: fh.close()
+        if self.logger: self.logger.warning("移动日志正被其他 ZenFile 进程使用，本进程的移动不写入日志")
+        return False
+
+    # ---------- 写入 ----------
+    def begin(self, source, target, batch_id=None):
+        return self.begin_many([(source, target)], batch_id)[0]
+
+    def begin_many(self, pairs, batch_id=None):
+        """记录一组移动意图并等待落盘，返回意图 id 列表 (未启用时为 None)"""
+        if not self.enabled:
+            return [None] * len(pairs)
+        ids = []
+        with self._cond:
+            for source, target in pairs:
+                op_id = uuid.uuid4().hex
+                ids.append(op_id)
+                self._open.add(op_id)
+                self._push({"op": "begin", "id": op_id, "batch_id": batch_id,
+                            "source": str(source), "target": str(target)})
+            seq = self._seq
+        self._sync(seq)
+        return ids
+
+    def done(self, *ids):
+        self._finish("done", ids)
+
+    def abort(self, *ids):
+        self._finish("abort", ids)
+
+    def _finish(self, op, ids):
+        ids = [i for i in ids if i]
+        if not ids: return
+        with self._cond:
+            for op_id in ids:
+                self._open.discard(op_id)
+            self._finished.append(json.dumps({"op": op, "ids": list(ids)}, ensure_ascii=False))
+            if not self._open and not self._flushing and self._lines > self.COMPACT_LINES:
+                # 没有进行中的移动：先落盘历史记录，确认写入成功后再清空日志
+                # (历史写入失败时记录只在内存中，保留意图以便崩溃后由恢复流程补写)
+                HistoryManager.flush()
+                if HistoryManager.is_flushed():
+                    self._truncate()
+
+    def _push(self, item):
+        self._buffer.append(json.dumps(item, ensure_ascii=False))
+        self._seq += 1
+
+    def _sync(self, seq, force=False):
+        """组提交：第一个到达的线程负责写入，其余线程等待结果"""
+        with self._cond:
+            while self._synced < seq or (force and self._finished):
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                lines, upto, finished = self._buffer, self._seq, self._finished
+                self._buffer, self._finished = [], []
+                self._cond.release()
+                written = 0
+                try:
+                    # done/abort 对应的历史记录都已落盘时才写入，否则留到下次
+                    if finished and (force or HistoryManager.is_flushed()):
+                        lines, finished = lines + finished, []
+                    self._write(lines)
+                    written = len(lines)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._finished = finished + self._finished
+                    self._synced = max(self._synced, upto)
+                    self._lines += written
+                    self._cond.notify_all()
+
+    def _write(self, lines):
+        if not lines: return
+        try:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(("\n" if self._torn else "") + "\n".join(lines) + "\n")
+            self._torn = False
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+        except Exception as e:
+            if self.logger: self.logger.error(f"写入移动日志失败: {e}")
+
+    def _truncate(self):
+        self._buffer, self._finished = [], []
+        self._synced = self._seq
+        self._lines = 0
+        self._torn = False
+        try:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+        except Exception as e:
+            if self.logger: self.logger.error(f"清空移动日志失败: {e}")
+
+    def close(self):
+        """退出前落盘缓冲区并释放锁"""
+        if not self.enabled: return
+        HistoryManager.flush()
+        with self._cond:
+            seq = self._seq
+        self._sync(seq, force=True)
+        with self._cond:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self.enabled = False
+            self._lock_fh.close()
+            self._lock_fh = None
+
+    # ---------- 恢复 ----------
+    def recover(self):
+        """
+        处理上次异常退出时未完成的移动意图
+        - 源在、目标不在：移动未发生，删除残留的临时文件 (回滚)
+        - 源不在、目标在：移动已完成，补写历史记录
+        - 源和目标都在：同一文件 (硬链接改名中断) 或内容确认一致 (大小、修改时间、哈希) 时删除源文件并补写历史，
+          否则两个文件都保留
+        须先 acquire()；未取得锁时不做任何处理
+        返回: {"completed", "rolled_back", "conflicts"}
+        """
+        result = {"completed": 0, "rolled_back": 0, "conflicts": 0}
+        if not self.enabled or not self.path.exists():
+            return result
+        intents, lines, raw = {}, 0, b"\n"
+        try:
+            # 按字节读取、逐行解码：写了一半的最后一行可能断在多字节字符 (如中文目录名) 中间
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    lines += 1
+                    try:
+                        item = json.loads(raw.decode("utf-8"))
+                    except ValueError:
+                        continue  # 无法解码或解析的行 (写了一半) 跳过
+                    if item.get("op") == "begin":
+                        intents[item["id"]] = item
+                    else:
+                        for op_id in item.get("ids", []):
+                            intents.pop(op_id, None)
+        except Exception as e:
+            if self.logger: self.logger.error(f"读取移动日志失败: {e}")
+            return result
+
+        recorded = []
+        for item in intents.values():
+            source, target = item["source"], item["target"]
+            try:
+                os.unlink(part_path(target, item["id"]))  # 只删除本次意图自己的临时文件
+            except OSError:
+                pass
+            src_exists, dst_exists = os.path.lexists(source), os.path.lexists(target)
+            if src_exists and dst_exists:
+                same = self._same_content(source, target)
+                if not same:
+                    result["conflicts"] += 1
+                    if self.logger: self.logger.warning(f"未完成的移动无法自动恢复: {source} -> {target}")
+                    continue
+                try:
+                    os.unlink(source)
+                except OSError:
+                    result["conflicts"] += 1
+                    continue
+                src_exists = False
+            if dst_exists and not src_exists:
+                if not HistoryManager.has_record(source, target):
+                    recorded.append((item.get("batch_id"), source, target))
+                result["completed"] += 1
+            elif src_exists:
+                result["rolled_back"] += 1
+            else:
+                result["conflicts"] += 1
+                if self.logger: self.logger.warning(f"未完成的移动源与目标都不存在: {source}")
+
+        batches = {}
+        for batch_id, source, target in recorded:
+            batches.setdefault(batch_id, []).append((source, target))
+        for batch_id, pairs in batches.items():
+            HistoryManager.add_records(pairs, batch_id)
+
+        # 补写的历史记录落盘后才清空日志，否则下次启动再恢复一次
+        HistoryManager.flush()
+        with self._cond:
+            if HistoryManager.is_flushed():
+                self._truncate()
+            else:
+                self._lines, self._torn = lines, not raw.endswith(b"\n")
+                if self.logger: self.logger.warning("历史记录尚未写入，暂不清空移动日志")
+        if intents and self.logger:
+            self.logger.warning(f"恢复未完成的移动: 补完 {result['completed']} 个，回滚 {result['rolled_back']} 个，"
+                                f"无法处理 {result['conflicts']} 个")
+        return result
+
+    @staticmethod
+    def _same_content(source, target):
+        try:
+            if os.path.samefile(source, target):
+                return True
+            src_st, dst_st = os.stat(source), os.stat(target)
+            if src_st.st_size != dst_st.st_size or src_st.st_mtime_ns != dst_st.st_mtime_ns:
+                return False  # 复制时保留了修改时间，不一致说明不是同一份内容
+            return full_hash(source) == full_hash(target)
+        except OSError:
+            return False
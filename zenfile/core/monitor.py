@@ -1,94 +1,358 @@
-import time
+import os
 import threading
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from pathlib import Path
+from .coalescer import EventCoalescer
+from .snapshot import SnapshotStore
+from zenfile.utils.metrics import metrics
 
 class FileMonitor(FileSystemEventHandler):
-    def __init__(self, organizer):
-        self.organizer = organizer
+    """只负责把事件交给合并器，不在 watchdog 线程上做任何文件操作"""
+    def __init__(self, coalescer, dir_cache=None, manager=None):
+        self.coalescer = coalescer
+        self.dir_cache = dir_cache
+        self.manager = manager
+    def _dir_changed(self, path):
+        # 目录被删除/改名时，目标目录缓存随之失效
+        if self.dir_cache: self.dir_cache.invalidate(path)
+    def dispatch(self, event):
+        metrics.inc("events", {"type": event.event_type})
+        super().dispatch(event)
     def on_created(self, event):
-        if not event.is_directory: self.organizer.process_file(event.src_path)
+        if not event.is_directory: self.coalescer.submit(event.src_path)
+        elif self.manager: self.manager.on_dir_added(event.src_path)
     def on_modified(self, event):
-        if not event.is_directory: self.organizer.process_file(event.src_path)
+        if not event.is_directory: self.coalescer.submit(event.src_path)
     def on_moved(self, event):
-        if not event.is_directory: self.organizer.process_file(event.dest_path)
+        if event.is_directory:
+            self._dir_changed(event.src_path)
+            self._dir_changed(event.dest_path)
+            if self.manager:
+                self.manager.on_dir_removed(event.src_path)
+                self.manager.on_dir_added(event.dest_path)
+        else:
+            self.coalescer.discard(event.src_path)
+            self.coalescer.submit(event.dest_path)
+    def on_deleted(self, event):
+        if event.is_directory:
+            self._dir_changed(event.src_path)
+            if self.manager: self.manager.on_dir_removed(event.src_path)
+        else: self.coalescer.discard(event.src_path)
+
+class PresenceHandler(FileSystemEventHandler):
+    """监听监控目录的父目录：目录被删除/创建/改名时通知 MonitorManager"""
+    def __init__(self, manager):
+        self.manager = manager
+    def on_any_event(self, event):
+        # 只关心目录的创建/删除/改名；父目录自身的 modified 等事件在其中任何文件变动时都会出现，必须忽略
+        if not event.is_directory or event.event_type not in ("created", "deleted", "moved"): return
+        paths = {str(Path(event.src_path))}
+        dest = getattr(event, "dest_path", None)
+        if dest: paths.add(str(Path(dest)))
+        if paths & self.manager.presence_targets():
+            self.manager.refresh_presence()
 
 class MonitorManager:
     def __init__(self, organizer, logger):
         self.organizer = organizer
         self.logger = logger
         self.observer = Observer()
-        self.handler = FileMonitor(organizer)
+        # 事件合并：同一文件的连续事件在静默窗口后只处理一次
+        quiet_window = organizer.config.get("event_quiet_window", 1.0)
+        self.coalescer = EventCoalescer(organizer.submit, quiet_window, logger)
+        self.handler = FileMonitor(self.coalescer, organizer.dir_cache, self)
+        metrics.gauge("queue_depth", lambda: self.coalescer.stats()["pending"], {"queue": "coalescer"})
+        metrics.gauge("watches", lambda: len(self.watches))
         self.running = False
+        # 实际调度的 watch：目录 -> (所属根目录, ObservedWatch)
+        # 递归模式下逐个子目录做非递归监控，这样被排除的子树 (分类文件夹等) 不占用系统 watch
+        self.watches = {}
+        self.root_signatures = {}  # 根目录 -> 建立监控时的范围配置
+        self.watch_lock = threading.RLock()
+
+        # 目录存在性跟踪：监听父目录事件，父目录不可监听时退回自适应轮询
+        self.presence_observer = Observer()
+        self.presence_handler = PresenceHandler(self)
+        self.presence_running = False
+        self.parent_watches = {}   # 父目录 -> ObservedWatch
+        self.poll_paths = set()    # 只能靠轮询发现的根目录
+        self._poll_event = threading.Event()
+        self.poll_min = organizer.config.get("presence_poll_min", 1.0)
+        self.poll_max = organizer.config.get("presence_poll_max", 30.0)
 
-        self.health_check_running = False
         # 活跃列表
         self.active_watch_paths = set()
         # 配置列表
         self.config_watch_paths = set()
 
+        # 目录快照：启动时只补整理离线期间新增/变化的文件
+        self.snapshots = SnapshotStore()
+        self._snapshot_data = None
+
     def start(self, dirs):
         self.config_watch_paths = set(str(Path(p)) for p in dirs)
 
         self.update_watches(dirs)
         if not self.running:
+            self.coalescer.start()
             self.observer.start()
             self.running = True
             self.logger.info("监控服务启动")
+            # 先建立监控再补扫，补扫期间新到的文件不会遗漏 (重复提交由合并器去重)
+            threading.Thread(target=self._catch_up, name="ZenFile-CatchUp", daemon=True).start()
 
-        if not self.health_check_running:
-            self.health_check_running = True
-            threading.Thread(target=self._health_check_loop, daemon=True).start()
-            self.logger.info("目录健康检查服务已启动")
+        if not self.presence_running:
+            self.presence_running = True
+            self.presence_observer.start()
+            threading.Thread(target=self._presence_poll_loop, name="ZenFile-Presence", daemon=True).start()
+            self.logger.info("目录存在性跟踪已启动")
+        self._sync_presence_watches()
 
     def stop(self):
-        self.health_check_running = False
+        if self.presence_running:
+            self.presence_running = False
+            self._poll_event.set()
+            self.presence_observer.stop()
+            self.presence_observer.join()
 
         if self.running:
             self.observer.stop()
             self.observer.join()
+            self.coalescer.stop()
+            # 等待工作线程处理完已排队的文件
+            self.organizer.shutdown(wait=True)
             self.running = False
+            st = self.coalescer.stats()
+            self.logger.info(f"事件合并统计: 收到 {st['received']} 个事件，处理 {st['emitted']} 次，合并 {st['collapsed']} 个")
+            self._save_snapshots()
+
+    # ---------- 启动补扫 ----------
+    def _catch_up(self):
+        """与上次退出时的快照对比，整理离线期间新增或变化的文件；目录修改时间未变的整个跳过"""
+        old = self.snapshots.load()
+        data = {}
+        total = skipped = 0
+        with self.watch_lock:
+            dirs = list(self.watches)
+        for d in dirs:
+            try:
+                changed, snap = SnapshotStore.diff(d, old.get(d))
+            except OSError:
+                continue
+            if snap is old.get(d):
+                skipped += 1
+            data[d] = snap
+            for path in changed:
+                self.coalescer.submit(path)
+            total += len(changed)
+        # 暂时不在的目录 (如未插入的移动硬盘) 保留旧快照
+        for d, snap in old.items():
+            if d not in data and any(Path(d) == Path(r) or Path(r) in Path(d).parents for r in self.config_watch_paths):
+                data[d] = snap
+        # 只保存在内存中：提交的文件还没有整理，退出 (stop) 时才写入快照；
+        # 中途崩溃时下次启动仍与旧快照对比，这些文件会再次补扫
+        self._snapshot_data = data
+        self.logger.info(f"启动补扫: 检查 {len(dirs)} 个目录 (跳过未变化 {skipped} 个)，发现 {total} 个新文件")
+
+    def _save_snapshots(self):
+        """
+        退出时 (工作线程处理完队列之后) 记录各监控目录的当前状态，供下次启动对比
+        退出时仍未整理的文件不记入快照，其所在目录下次启动时重新对比
+        """
+        data = dict(self._snapshot_data or self.snapshots.load())
+        unfinished = {}
+        for p in self.organizer.unfinished:
+            path = Path(p)
+            unfinished.setdefault(str(path.parent), set()).add(path.name)
+        with self.watch_lock:
+            dirs = list(self.watches)
+        for d in dirs:
+            try:
+                snap = SnapshotStore.capture(d)
+            except OSError:
+                continue
+            names = unfinished.get(str(Path(d)))
+            if names:
+                snap["mtime"] = None
+                for name in names:
+                    snap["entries"].pop(name, None)
+            data[d] = snap
+        self.snapshots.save(data)
 
     def update_watches(self, new_dirs):
         self.config_watch_paths = set(str(Path(p)) for p in new_dirs)
+        self.coalescer.quiet_window = self.organizer.config.get("event_quiet_window", 1.0)
 
-        self.observer.unschedule_all()
+        with self.watch_lock:
+            # 只处理差异：新增的根目录建立监控，消失/移除的根目录撤销监控，其余保持不动
+            wanted = {}
+            for p in new_dirs:
+                path = Path(p)
+                if path.exists():
+                    scope = self.organizer.scope_for(path)
+                    wanted[str(path)] = scope
+            removed = {r for r in self.active_watch_paths
+                       if r not in wanted or self.root_signatures.get(r) != wanted[r].signature}
+            added = [r for r in wanted if r not in self.active_watch_paths or r in removed]
 
-        self.active_watch_paths.clear()
-        count = 0
-        for p in new_dirs:
-            path = Path(p)
-            if path.exists():
+            dropped = []
+            for root in removed:
+                dropped += self._unschedule_root(root)
+            if removed or added:
+                # 目录可能已重新挂载，设备号缓存需重新获取
+                self.organizer.mover.invalidate()
+            for root in added:
+                try:
+                    self._schedule_tree(wanted[root], Path(root))
+                    self.active_watch_paths.add(root)
+                    self.root_signatures[root] = wanted[root].signature
+                except Exception as e:
+                    self.logger.warning(f"无法监控目录 {root}: {e}")
+            if dropped:
+                # 被撤销的子目录可能同时属于另一个仍在监控的根目录，只为这些根目录补建监控
+                for root in self.active_watch_paths - set(added):
+                    scope = wanted[root]
+                    if any(scope.contains(k) for k in dropped):
+                        self._schedule_tree(scope, Path(root))
+
+        if added or removed:
+            self.logger.info(f"监控列表更新，新增 {len(added)} 个，移除 {len(removed)} 个，"
+                             f"共监控 {len(self.active_watch_paths)} 个目录 ({len(self.watches)} 个系统 watch)")
+        if self.presence_running:
+            self._sync_presence_watches()
+
+    def _unschedule_root(self, root):
+        """撤销某个根目录下的全部监控，返回被撤销的目录列表"""
+        dropped = []
+        for key, (owner, watch) in list(self.watches.items()):
+            if owner != root: continue
+            del self.watches[key]
+            dropped.append(key)
+            try:
+                self.observer.unschedule(watch)
+            except (KeyError, OSError):
+                pass
+        self.active_watch_paths.discard(root)
+        self.root_signatures.pop(root, None)
+        return dropped
+
+    def _schedule_tree(self, scope, start):
+        """为 start 及其范围内的子目录逐个建立非递归监控"""
+        root = str(scope.root)
+        for d in scope.walk(start):
+            key = str(d)
+            if key in self.watches: continue
+            try:
+                watch = self.observer.schedule(self.handler, key, recursive=False)
+                self.watches[key] = (root, watch)
+            except OSError as e:
+                self.logger.warning(f"无法监控目录 {key}: {e}")
+
+    def _scope_of(self, path):
+        for root in self.active_watch_paths:
+            scope = self.organizer.scope_for(root)
+            if scope.recursive and scope.contains(path):
+                return scope
+        return None
+
+    def on_dir_added(self, path):
+        """递归监控根目录下新增 (或移入) 子目录：加入监控并整理其中已有的文件"""
+        with self.watch_lock:
+            scope = self._scope_of(path)
+            if not scope or not scope.allows(path): return
+            new_dirs = [d for d in scope.walk(path) if str(d) not in self.watches]
+            self._schedule_tree(scope, path)
+        for d in new_dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_file(follow_symlinks=False):
+                            self.coalescer.submit(entry.path)
+            except OSError:
+                pass
+
+    def on_dir_removed(self, path):
+        """子目录被删除或移走：撤销其下的全部监控 (根目录由健康检查处理)"""
+        prefix = str(Path(path))
+        with self.watch_lock:
+            for key in list(self.watches):
+                if key in self.active_watch_paths: continue
+                if key == prefix or key.startswith(prefix + os.sep):
+                    _, watch = self.watches.pop(key)
+                    try:
+                        self.observer.unschedule(watch)
+                    except (KeyError, OSError):
+                        pass
+
+    # ---------- 目录存在性跟踪 ----------
+    def presence_targets(self):
+        """父目录监听关心的路径：配置的根目录及其父目录"""
+        return self.config_watch_paths | set(self.parent_watches)
+
+    def _sync_presence_watches(self):
+        """为每个配置目录的父目录建立监听；父目录不存在 (如整个盘符被拔出) 的根目录改为轮询"""
+        with self.watch_lock:
+            wanted, poll = set(), set()
+            for root in self.config_watch_paths:
+                parent = str(Path(root).parent)
+                if parent != root and Path(parent).is_dir():
+                    wanted.add(parent)
+                else:
+                    poll.add(root)
+            for parent in list(self.parent_watches):
+                if parent not in wanted:
+                    watch = self.parent_watches.pop(parent)
+                    try:
+                        self.presence_observer.unschedule(watch)
+                    except (KeyError, OSError):
+                        pass
+            for parent in wanted - set(self.parent_watches):
                 try:
-                    self.observer.schedule(self.handler, str(path), recursive=False)
-                    self.active_watch_paths.add(str(path))
-                    count += 1
-                except: pass
-        self.logger.info(f"监控列表更新，共监控 {count} 个目录")
-
-    # 心跳检测
-    def _health_check_loop(self):
-        while self.health_check_running:
-            time.sleep(3)  # 每3秒检查一次
+                    self.parent_watches[parent] = self.presence_observer.schedule(
+                        self.presence_handler, parent, recursive=False)
+                except OSError:
+                    # 父目录无法监听 (权限等)，其下的根目录改为轮询
+                    poll |= {r for r in self.config_watch_paths if str(Path(r).parent) == parent}
+            self.poll_paths = poll
+        self._poll_event.set()  # 唤醒轮询线程，按新的列表重新计时
+
+    def refresh_presence(self):
+        """根目录出现或消失：按差异更新监控"""
+        try:
+            before = set(self.active_watch_paths)
+            self.update_watches(list(self.config_watch_paths))
+            after = self.active_watch_paths
+            for p in before - after:
+                self.logger.warning(f"目录丢失: {p}")
+            for p in after - before:
+                self.logger.info(f"目录恢复: {p}")
+        except Exception as e:
+            self.logger.error(f"目录状态更新出错: {e}")
+
+    def _presence_poll_loop(self):
+        """
+        兜底轮询：只检查 poll_paths 中的目录，间隔从 poll_min 开始，
+        无变化时逐步翻倍到 poll_max；没有需要轮询的目录时完全休眠
+        """
+        interval = self.poll_min
+        while self.presence_running:
+            if not self.poll_paths:
+                self._poll_event.wait()
+                self._poll_event.clear()
+                interval = self.poll_min
+                continue
+            if self._poll_event.wait(interval):
+                self._poll_event.clear()
+                interval = self.poll_min
+                continue
             try:
-                reload = False
-
-                # 检查目录是否丢失
-                for p in list(self.active_watch_paths):
-                    if not Path(p).exists():
-                        self.logger.warning(f"目录丢失: {p}")
-                        reload = True
-
-                # 检查目录是否恢复 (在配置里但不在活跃列表里)
-                missing = self.config_watch_paths - self.active_watch_paths
-                for p in missing:
-                    if Path(p).exists():
-                        self.logger.info(f"目录恢复: {p}")
-                        reload = True
-
-                if reload:
-                    self.update_watches(list(self.config_watch_paths))
-            except Exception as e:
-                self.logger.error(f"健康检查错: {e}")
+                changed = any(Path(p).exists() != (p in self.active_watch_paths) for p in list(self.poll_paths))
+            except Exception:
+                changed = False
+            if changed:
+                self.refresh_presence()
+                interval = self.poll_min
+            else:
+                interval = min(interval * 2, self.poll_max)
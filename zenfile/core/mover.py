@@ -0,0 +1,228 @@
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+PART_SUFFIX = ".zenpart"  # 跨盘复制中的临时文件后缀
+_CHUNK = 8 * 1024 * 1024
+_LOCK_WINERRORS = (32, 33)  # ERROR_SHARING_VIOLATION / ERROR_LOCK_VIOLATION
+_LOCK_ERRNOS = (errno.EBUSY, getattr(errno, "ETXTBSY", errno.EBUSY))
+
+
+def part_path(target, tag):
+    """跨盘复制的临时文件名：目标名 + 标识 (移动意图 id) + 后缀，恢复时按意图 id 找回"""
+    return f"{target}.{tag[:12]}{PART_SUFFIX}"
+
+
+def is_lock_error(e):
+    """是否为文件被其他程序占用导致的暂时性错误 (值得稍后重试)；权限不足、只读等返回 False"""
+    if not isinstance(e, OSError): return False
+    winerror = getattr(e, "winerror", None)
+    if winerror is not None:
+        return winerror in _LOCK_WINERRORS
+    return e.errno in _LOCK_ERRNOS
+
+
+class MoveEngine:
+    """
+    文件移动引擎
+    - 缓存目录所在设备号：源、目标同盘时直接改名
+    - 改名一律不覆盖：目标已存在时抛出 FileExistsError，由调用方换名重试
+    - 跨盘时复制到独占创建的临时文件后再改名：Linux 用内核态复制 (copy_file_range / sendfile)，
+      其他平台用 shutil.copy2 (Windows 上为系统复制)；可选大小/哈希校验，最后删除源文件
+    - 记录每种路径的次数、耗时与字节数，便于分析时间花在哪里
+    """
+
+    def __init__(self, verify="size", logger=None):
+        self.verify = None if verify in (None, "none") else verify  # None / "size" / "hash"
+        self.logger = logger
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._unremoved = {}  # 已复制但删除失败的源文件 -> (大小, 修改时间)
+
+    def _device(self, directory):
+        key = str(directory)
+        dev = self._devices.get(key)
+        if dev is None:
+            dev = os.stat(directory).st_dev
+            self._devices[key] = dev
+        return dev
+
+    def invalidate(self, directory=None):
+        """目录被移除/重新挂载后丢弃设备号缓存"""
+        with self._lock:
+            if directory is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(str(directory), None)
+
+    def stats(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    def _record(self, method, seconds, size):
+        with self._lock:
+            st = self._stats.setdefault(method, {"count": 0, "seconds": 0.0, "bytes": 0})
+            st["count"] += 1
+            st["seconds"] += seconds
+            st["bytes"] += size
+
+    def move(self, source, target, tag=None):
+        """
+        移动文件，返回实际采用的方式: rename / copy_file_range / sendfile / copy
+        tag: 跨盘复制时临时文件名中的标识 (移动意图 id)，不指定时随机生成
+        """
+        start = time.perf_counter()
+        source, target = str(source), str(target)
+        src_st = os.stat(source)
+
+        same_device = False
+        try:
+            same_device = self._device(os.path.dirname(source)) == self._device(os.path.dirname(target))
+        except OSError:
+            pass
+
+        if same_device:
+            try:
+                _place(source, target)
+                self._record("rename", time.perf_counter() - start, src_st.st_size)
+                return "rename"
+            except OSError as e:
+                if e.errno != errno.EXDEV: raise
+                # 设备号相同却跨盘 (如绑定挂载)，退回复制
+                self.invalidate(os.path.dirname(target))
+
+        method = self._copy_across(source, target, src_st, tag)
+        self._record(method, time.perf_counter() - start, src_st.st_size)
+        return method
+
+    def _copy_across(self, source, target, src_st, tag=None):
+        # 临时文件名带标识并独占创建，不会覆盖 (失败时也不会误删) 同名的用户文件
+        tmp = part_path(target, tag or uuid.uuid4().hex)
+        os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)))
+        try:
+            method = self._copy_data(source, tmp, src_st.st_size)
+            shutil.copystat(source, tmp)
+            self._verify(source, tmp, src_st.st_size)
+            _place(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        try:
+            os.unlink(source)
+        except OSError as e:
+            # 目标已完整落地，移动视为成功；记下源文件待删除，之后再遇到时只删除、不再复制一份
+            with self._lock:
+                self._unremoved[source] = (src_st.st_size, src_st.st_mtime_ns)
+            if self.logger: self.logger.warning(f"已复制到目标，源文件暂时无法删除 (待清理) {source}: {e}")
+        return method
+
+    def finish_pending(self, source, st):
+        """
+        source 是否为之前已复制成功、但未能删除的源文件：是则再次尝试删除并返回 True (无需再整理)
+        文件在此期间被修改过时视为新文件，返回 False
+        """
+        source = str(source)
+        pending = self._unremoved.get(source)
+        if pending is None: return False
+        with self._lock:
+            self._unremoved.pop(source, None)
+        if pending != (st.st_size, st.st_mtime_ns):
+            return False
+        try:
+            os.unlink(source)
+            if self.logger: self.logger.info(f"已删除待清理的源文件 {source}")
+        except FileNotFoundError:
+            pass
+        except OSError:
+            with self._lock:
+                self._unremoved[source] = pending
+        return True
+
+    @staticmethod
+    def _copy_data(source, dest, size):
+        """复制到已创建的临时文件 dest"""
+        with open(source, "rb") as fsrc, open(dest, "wb") as fdst:
+            in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+            # 1. copy_file_range：同一文件系统类型间可在内核中直接复制 (Linux)
+            if hasattr(os, "copy_file_range"):
+                try:
+                    copied = 0
+                    while copied < size:
+                        n = os.copy_file_range(in_fd, out_fd, min(_CHUNK, size - copied))
+                        if n == 0: break
+                        copied += n
+                    if copied == size:
+                        return "copy_file_range"
+                except OSError:
+                    pass
+                fsrc.seek(0); fdst.seek(0); fdst.truncate()
+            # 2. sendfile：Linux 下可写入普通文件
+            if hasattr(os, "sendfile") and os.name == "posix":
+                try:
+                    offset = 0
+                    while offset < size:
+                        n = os.sendfile(out_fd, in_fd, offset, min(_CHUNK, size - offset))
+                        if n == 0: break
+                        offset += n
+                    if offset == size:
+                        return "sendfile"
+                except OSError:
+                    pass
+                fsrc.seek(0); fdst.seek(0); fdst.truncate()
+        # 3. 其他平台 (如 Windows) 交给 shutil.copy2：Python 3.12+ 在 Windows 上调用系统的 CopyFile2，
+        #    比逐块读写快；覆盖的是上面独占创建的临时文件
+        shutil.copy2(source, dest)
+        return "copy"
+
+    def _verify(self, source, copy, size):
+        if not self.verify: return
+        if os.path.getsize(copy) != size:
+            raise OSError(f"复制校验失败 (大小不一致): {copy}")
+        if self.verify == "hash" and _file_hash(source) != _file_hash(copy):
+            raise OSError(f"复制校验失败 (哈希不一致): {copy}")
+
+
+def _place(source, target):
+    """
+    不覆盖地将 source 改名为 target (同一文件系统内)，目标已存在时抛出 FileExistsError
+    POSIX 的 rename 会静默覆盖，因此用 link + unlink；Windows 的 rename 本身不覆盖
+    """
+    if os.name == "nt":
+        os.rename(source, target)
+        return
+    try:
+        os.link(source, target, follow_symlinks=False)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno == errno.EXDEV: raise
+        # 文件系统不支持硬链接 (如 FAT/exFAT) 时退回先检查再改名
+        if os.path.lexists(target):
+            raise FileExistsError(errno.EEXIST, "目标已存在", target)
+        os.rename(source, target)
+        return
+    try:
+        os.unlink(source)
+    except OSError:
+        # 删除原名失败则撤销链接，保持"要么移动、要么未动"
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
+        raise
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
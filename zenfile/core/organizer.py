@@ -1,122 +1,527 @@
-import shutil
-import time
+import os
 import sys
+import time
 import uuid
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from pathlib import Path
 from .history import HistoryManager
-from .rules import RuleMatcher
+from .executor import TaskExecutor
+from .readiness import ReadinessChecker, RetryQueue
+from .dircache import DirectoryCache
+from .mover import MoveEngine, is_lock_error
+from .dedup import DuplicateDetector
+from .scope import WatchScope
+from .ruleset import RuleSet
+from .journal import MoveJournal
+from zenfile.utils.metrics import metrics
 
 
 class Organizer:
-    def __init__(self, config, logger):
+    PLACE_ATTEMPTS = 5  # 目标名被占用时换名重试的次数
+
+    def __init__(self, config, logger, dry_run=False):
+        """dry_run=True：只用于生成整理计划，不占用移动日志、不执行启动恢复"""
         self.logger = logger
         self.paused = False
         self.ignore_next_paths = set()
         self.ignore_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        # 退出时未能整理的文件 (未就绪、重试被丢弃)，不记入目录快照，下次启动补扫时重新处理
+        self.unfinished = set()
+        # 目标目录与文件名索引缓存
+        self.dir_cache = DirectoryCache()
+        # 移动引擎：同盘直接 rename，跨盘走内核态复制
+        self.mover = MoveEngine(verify=config.get("move_verify", "size"), logger=logger)
+        # 移动预写日志：先处理上次异常退出时未完成的移动
+        self.journal = MoveJournal(logger=logger, fsync=config.get("journal_fsync", False))
+        if not dry_run and self.journal.acquire():
+            self.journal.recover()
+        self.dedup = None
         self.reload_config(config)
+        # 工作线程池：监控事件在这里排队处理，不占用 watchdog 线程
+        self.executor = TaskExecutor(
+            self.process_file,
+            workers=config.get("worker_threads", 4),
+            queue_size=config.get("queue_size", 1000),
+            logger=logger
+        )
+        # 就绪检查：文件仍在写入时延后重试，而不是固定等待
+        self.readiness = ReadinessChecker(config.get("ready_settle_time", 2.0))
+        self.retry_queue = RetryQueue(
+            self._resubmit,
+            base_delay=config.get("retry_base_delay", 0.5),
+            max_delay=config.get("retry_max_delay", 30.0),
+            max_attempts=config.get("retry_max_attempts", 10),
+            logger=logger
+        )
+        metrics.gauge("queue_depth", lambda: self.executor.depth, {"queue": "worker"})
+        metrics.gauge("queue_depth", lambda: self.retry_queue.pending, {"queue": "retry"})
 
     def reload_config(self, new_config):
-        self.config = new_config
-        self.matcher = RuleMatcher(new_config)
-        raw_dirs = new_config.get("watch_dirs", [])
-        self.watch_dirs = []
-        for p in raw_dirs:
-            try:
-                path_obj = Path(p)
-                if path_obj.exists():
-                    self.watch_dirs.append(path_obj)
-            except:
-                pass
-        self.logger.info(f"配置重载完成，当前生效目录数: {len(self.watch_dirs)}")
+        """编译新的规则快照后一次性替换，正在处理的文件继续使用旧快照"""
+        rules = RuleSet(new_config)
+        HistoryManager.configure(max_records=rules.config.get("history_max_records"))
+        if rules.dedup_mode != "off" and self.dedup is None:
+            self.dedup = DuplicateDetector(rules.config.get("dedup_workers", 2), self.logger)
+        self.rules = rules
+        self.logger.info(f"配置重载完成，当前生效目录数: {len(rules.watch_dirs)}")
+
+    # 以下属性均从当前快照读取；同一文件的处理过程中应先取 self.rules 再使用，避免前后读到不同快照
+    @property
+    def config(self):
+        return self.rules.config
+
+    @property
+    def matcher(self):
+        return self.rules.matcher
+
+    @property
+    def watch_dirs(self):
+        return self.rules.watch_dirs
+
+    @property
+    def scopes(self):
+        return self.rules.scopes
+
+    @property
+    def dedup_mode(self):
+        return self.rules.dedup_mode
 
     def set_paused(self, paused):
         self.paused = paused
         state = "暂停" if paused else "恢复"
         self.logger.info(f"监控已{state}")
 
-    def process_file(self, file_path_str, force=False, batch_id=None):
-        if self.paused and not force: return
+    @staticmethod
+    def _path_key(path):
+        return str(path).lower() if sys.platform == 'win32' else str(path)
+
+    def submit(self, file_path_str):
+        """将文件交给工作线程池处理 (队列满时阻塞)"""
+        if self.paused: return
+        self.executor.submit(self._path_key(Path(file_path_str)), file_path_str)
+
+    def shutdown(self, wait=True):
+        """
+        停止工作线程，wait=True 时先处理完队列中的任务
+        关闭后不可再提交：等待重试的文件直接丢弃 (记入 unfinished)，由下次启动时的补扫处理
+        """
+        for args in self.retry_queue.stop():
+            self.unfinished.add(args[0])
+        self.executor.shutdown(wait=wait)
+        self.journal.close()
+        if self.dedup: self.dedup.close()
+
+    def _resubmit(self, file_path_str, force=False, batch_id=None):
+        self.executor.submit(self._path_key(Path(file_path_str)), file_path_str, force, batch_id)
+
+    def _defer(self, file_path, path_key, force, batch_id):
+        """文件未就绪：交给重试队列按指数退避稍后再试"""
+        if self.retry_queue.schedule(path_key, str(file_path), force, batch_id):
+            metrics.inc("retries")
+        elif self.retry_queue.stopped:
+            # 正在退出：不再重试，留给下次启动时的补扫
+            self.unfinished.add(str(file_path))
+            metrics.inc("skips", {"reason": "shutdown"})
+            self.logger.info(f"正在退出，未就绪的文件留待下次整理: {file_path.name}")
+        else:
+            metrics.inc("skips", {"reason": "not_ready"})
+            self.readiness.forget(path_key)
+            self.logger.warning(f"文件长时间未就绪，放弃整理: {file_path.name}")
+
+    def process_file(self, file_path_str, force=False, batch_id=None, st=None):
+        """处理单个文件，成功移动时返回目标分类文件夹名，否则返回 None"""
+        if self.paused and not force: return None
+        with metrics.stage("process"):
+            return self._process(file_path_str, force, batch_id, st)
+
+    def _process(self, file_path_str, force, batch_id, st):
+        rules = self.rules  # 整个处理过程使用同一份规则快照
         try:
             file_path = Path(file_path_str)
             # 白名单检查
-            path_key = str(file_path).lower() if sys.platform == 'win32' else str(file_path)
+            path_key = self._path_key(file_path)
             with self.ignore_lock:
                 if path_key in self.ignore_next_paths:
                     self.ignore_next_paths.remove(path_key)
-                    return
+                    metrics.inc("skips", {"reason": "whitelist"})
+                    return None
+
+            if st is None:
+                try:
+                    st = os.stat(file_path)
+                except FileNotFoundError:
+                    self.retry_queue.clear(path_key)
+                    self.readiness.forget(path_key)
+                    return None
+            if self.mover.finish_pending(file_path, st):
+                metrics.inc("skips", {"reason": "pending_removal"})
+                return None
+            if getattr(sys, 'frozen', False) and file_path == Path(sys.executable): return None
+            if file_path.name.startswith(".") or file_path.name.startswith("~$"):
+                metrics.inc("skips", {"reason": "hidden"})
+                return None
 
-            if not file_path.exists(): return
-            if getattr(sys, 'frozen', False) and file_path == Path(sys.executable): return
-            if file_path.name.startswith(".") or file_path.name.startswith("~$"): return
+            with metrics.stage("match"):
+                should_ignore, target_folder = rules.matcher.match(file_path, st)
+            if should_ignore:
+                metrics.inc("skips", {"reason": "ignored"})
+                return None
 
-            should_ignore, target_folder = self.matcher.match(file_path)
-            if should_ignore: return
+            with metrics.stage("ready"):
+                ready = self.readiness.check(file_path, path_key, st)
+            if not ready:
+                self._defer(file_path, path_key, force, batch_id)
+                return None
 
-            self._move_file(file_path, target_folder, batch_id)
+            moved = self._move_file(file_path, target_folder, batch_id, rules.dedup_mode)
+            if moved is None:
+                # 移动时仍被占用，稍后重试
+                self._defer(file_path, path_key, force, batch_id)
+                return None
+            self.retry_queue.clear(path_key)
+            return target_folder if moved else None
         except Exception as e:
+            metrics.inc("errors", {"stage": "process"})
             self.logger.error(f"处理出错 {file_path_str}: {e}")
+            return None
 
-    def _move_file(self, source, folder, batch_id=None):
+    def _move_file(self, source, folder, batch_id=None, dedup_mode=None):
+        """返回 True 成功，False 失败，None 表示文件被占用可稍后重试"""
+        dedup_mode = dedup_mode or self.dedup_mode
         target_dir = source.parent / folder
+        target = op_id = None
         try:
-            target_dir.mkdir(parents=True, exist_ok=True)
-            target = target_dir / source.name
-            counter = 1
-            while target.exists():
-                target = target_dir / f"{source.stem}_{counter}{source.suffix}"
-                counter += 1
-
-            time.sleep(0.05)
-            shutil.move(str(source), str(target))
-            HistoryManager.add_record(source, target, batch_id)
-            self.logger.info(f"整理: {source.name} -> {folder}")
+            self.dir_cache.ensure_dir(target_dir)
+            target = self.dir_cache.reserve(target_dir, source.name)
+            # 缓存可能落后于外部改动：仅做一次存在性确认，冲突则重建该目录索引
+            if os.path.lexists(target):
+                self.dir_cache.invalidate(target_dir)
+                target = self.dir_cache.reserve(target_dir, source.name)
+
+            # 同名冲突：可选的重复文件检测
+            if target.name != source.name and self.dedup and dedup_mode != "off":
+                handled = self._handle_duplicate(source, target, target_dir / source.name, folder, batch_id, dedup_mode)
+                if handled is not None:
+                    return handled
+
+            timing = {}
+            placed, target = target, None  # 之后的归还/撤销由 _place 负责
+            target, method = self._place(source, placed, batch_id, timing=timing)
+            op_id = timing["op_id"]
+            with metrics.stage("history") as t_history:
+                HistoryManager.add_record(source, target, batch_id, folder)
+            self.journal.done(op_id)
+            metrics.inc("moves", {"method": method})
+            # JSON 日志格式下附带结构化字段与各阶段耗时
+            fields = {"event": "move", "source": str(source), "target": str(target), "folder": folder,
+                      "method": method, "batch_id": batch_id,
+                      "journal_ms": round(timing["journal"] * 1000, 3),
+                      "move_ms": round(timing["move"] * 1000, 3),
+                      "history_ms": round(t_history["seconds"] * 1000, 3)}
+            if method == "rename":
+                self.logger.info(f"整理: {source.name} -> {folder}", extra={"fields": fields})
+            else:
+                self.logger.info(f"整理: {source.name} -> {folder} (跨盘 {method})", extra={"fields": fields})
             return True
         except Exception as e:
+            if target is not None:
+                self._abort_move(op_id, target)
+                self.dir_cache.release(target)
+            if is_lock_error(e):
+                # 只有被占用才重试；权限不足、只读目标等直接记为失败
+                metrics.inc("errors", {"stage": "locked"})
+                self.logger.warning(f"文件被占用，稍后重试 {source.name}: {e}")
+                return None
+            self.dir_cache.invalidate(target_dir)
+            metrics.inc("errors", {"stage": "move"})
             self.logger.error(f"移动失败 {source.name}: {e}")
             return False
 
-    def run_now(self):
+    def _place(self, source, target, batch_id=None, op_id=None, timing=None):
+        """
+        将 source 移动到已预留的 target，返回 (实际目标, 移动方式)
+        - op_id 为已写入的移动意图 (批量预写时)，否则在这里写入
+        - 移动不会覆盖：目标名在预留之后被外部占用时，撤销意图、重建目录索引、换名重试
+        - 失败时归还预留的文件名并撤销意图后抛出异常
+        timing: 可选 dict，写入 "journal"/"move" 耗时 (秒) 与最终的 "op_id"
+        """
+        timing = {} if timing is None else timing
+        timing.setdefault("journal", 0.0)
+        target_dir = target.parent
+        attempt = 0
+        try:
+            while True:
+                if op_id is None:
+                    with metrics.stage("journal") as t:
+                        op_id = self.journal.begin(source, target, batch_id)
+                    timing["journal"] += t["seconds"]
+                try:
+                    with metrics.stage("move") as t:
+                        method = self.mover.move(source, target, tag=op_id)
+                    timing["move"] = t["seconds"]
+                    break
+                except FileExistsError:
+                    self.journal.abort(op_id)
+                    op_id = None
+                    attempt += 1
+                    if attempt >= self.PLACE_ATTEMPTS: raise
+                    self.dir_cache.release(target)
+                    self.dir_cache.invalidate(target_dir)
+                    target = self.dir_cache.reserve(target_dir, source.name)
+        except BaseException:
+            self._abort_move(op_id, target)
+            self.dir_cache.release(target)
+            raise
+        self.dir_cache.commit(target)
+        timing["op_id"] = op_id
+        return target, method
+
+    def _abort_move(self, op_id, target):
+        """移动失败：目标未生成时撤销意图；否则保留，由下次启动时的恢复流程处理"""
+        if op_id and not os.path.lexists(target):
+            self.journal.abort(op_id)
+
+    def cancel_run(self):
+        """取消正在进行的一键整理或撤销"""
+        self._cancel_event.set()
+
+    def scope_for(self, path):
+        """返回监控目录对应的 WatchScope (未配置时按非递归处理)"""
+        key = str(Path(path))
+        scope = self.scopes.get(key)
+        if scope is None:
+            scope = WatchScope(key, None, self.matcher.category_roots())
+        return scope
+
+    def _scan_dir(self, d, scope):
+        """用 scandir 列出目录中的文件与需要继续扫描的子目录，复用 DirEntry 自带的 stat 信息"""
+        files, subdirs = [], []
+        with os.scandir(d) as it:
+            for entry in it:
+                if self._cancel_event.is_set(): break
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        files.append((entry.path, entry.stat(follow_symlinks=False)))
+                    elif scope.recursive and entry.is_dir(follow_symlinks=False) and scope.allows(entry.path):
+                        subdirs.append(entry.path)
+                except OSError:
+                    pass
+        return files, subdirs
+
+    def _handle_duplicate(self, source, target, existing, folder, batch_id, mode):
+        """
+        source 与已存在的同名文件内容相同时按 dedup_mode 处理
+        返回 None 表示不是重复文件或硬链接失败 (继续正常移动到 target)，否则返回 _move_file 的结果
+        """
+        if not self.dedup.is_duplicate(source, existing):
+            return None
+        if mode == "hardlink":
+            op_id, linked = None, False
+            try:
+                # 目标位置放一个指向已有文件的硬链接，源文件删除，释放重复空间
+                op_id = self.journal.begin(source, target, batch_id)
+                os.link(existing, target)
+                linked = True
+                os.unlink(source)
+            except OSError as e:
+                # 撤销已做的部分 (删除刚建立的链接、撤销意图) 后按普通文件移动；
+                # 预留的文件名留给接下来的普通移动使用，移动失败时由 _place 归还
+                if linked:
+                    try:
+                        os.unlink(target)
+                    except OSError:
+                        pass
+                self._abort_move(op_id, target)
+                self.logger.warning(f"硬链接失败，按普通文件移动 {source.name}: {e}")
+                return None
+            self.dir_cache.commit(target)
+            HistoryManager.add_record(source, target, batch_id, folder)
+            self.journal.done(op_id)
+            metrics.inc("moves", {"method": "hardlink"})
+            self.logger.info(f"整理: {source.name} -> {folder} (重复文件，已硬链接)")
+            return True
+        self.dir_cache.release(target)
+        if mode == "record":
+            self.dedup.record(source, existing)
+        metrics.inc("skips", {"reason": "duplicate"})
+        self.logger.info(f"跳过重复文件: {source.name} (与 {folder}/{existing.name} 相同)")
+        return False
+
+    def run_now(self, progress_callback=None):
+        """
+        一键整理：并发扫描所有监控目录并并发处理文件
+        progress_callback(done, total): 每处理完一个文件回调一次 (在工作线程中调用)
+        返回: {"total", "moved", "categories", "elapsed", "cancelled"}
+        """
         self.logger.info(">>> 开始一键整理")
-        count = 0
+        start = time.perf_counter()
+        self._cancel_event.clear()
         batch_id = str(uuid.uuid4())
-        current_dirs = list(self.watch_dirs)
-        for d in current_dirs:
-            if not d.exists(): continue
-            try:
-                for f in d.iterdir():
-                    if f.is_file():
-                        self.process_file(f, force=True, batch_id=batch_id)
-                        count += 1
-            except Exception as e:
-                self.logger.error(f"扫描失败 {d}: {e}")
-        self.logger.info(f"<<< 整理完成，处理 {count} 个文件")
-        return count
-
-    def undo_last_action(self):
-        records = HistoryManager.pop_last_batch()
-        if not records: return False, "无可撤销操作"
-        success, fail = 0, 0
-        for rec in records:
-            try:
-                src = Path(rec['source'])
-                tgt = Path(rec['target'])
-                if not tgt.exists():
-                    fail += 1;
-                    continue
+        categories = {}
+        total = done = 0
+
+        current_dirs = [d for d in self.watch_dirs if d.exists()]
+        workers = self.config.get("run_now_workers", 8)
+        with HistoryManager.live_batch(batch_id), \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ZenFile-RunNow") as pool:
+            scan_futures = {}
+            for d in current_dirs:
+                scope = self.scope_for(d)
+                scan_futures[pool.submit(self._scan_dir, d, scope)] = (d, scope)
+            file_futures = []
+            pending = set(scan_futures)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    d, scope = scan_futures.pop(fut)
+                    try:
+                        files, subdirs = fut.result()
+                    except Exception as e:
+                        self.logger.error(f"扫描失败 {d}: {e}")
+                        continue
+                    # 递归模式：子目录作为新的扫描任务并发执行
+                    for sub in subdirs:
+                        if self._cancel_event.is_set(): break
+                        sub_fut = pool.submit(self._scan_dir, sub, scope)
+                        scan_futures[sub_fut] = (sub, scope)
+                        pending.add(sub_fut)
+                    total += len(files)
+                    for path, st in files:
+                        if self._cancel_event.is_set(): break
+                        file_futures.append(pool.submit(self._run_one, path, st, batch_id))
+
+            for fut in as_completed(file_futures):
+                folder = fut.result()
+                done += 1
+                if folder:
+                    categories[folder] = categories.get(folder, 0) + 1
+                if progress_callback:
+                    try:
+                        progress_callback(done, total)
+                    except Exception:
+                        pass
+
+        cancelled = self._cancel_event.is_set()
+        result = {
+            "total": total,
+            "moved": sum(categories.values()),
+            "categories": categories,
+            "elapsed": time.perf_counter() - start,
+            "cancelled": cancelled,
+        }
+        state = "已取消" if cancelled else "整理完成"
+        self.logger.info(f"<<< {state}，扫描 {total} 个文件，移动 {result['moved']} 个，耗时 {result['elapsed']:.2f}s")
+        return result
 
-                if src.exists():
-                    src = src.parent / f"{src.stem}_undo{src.suffix}"
+    def plan_run(self, progress_callback=None):
+        """预览：生成完整的整理计划 (不移动任何文件)，返回 OrganizePlan"""
+        from .planner import Planner
+        return Planner(self).plan(progress_callback)
 
-                src.parent.mkdir(parents=True, exist_ok=True)
+    def apply_plan(self, plan, progress_callback=None):
+        """按目标目录分组执行整理计划，整批作为一次可撤销的操作"""
+        from .planner import Planner
+        return Planner(self).apply(plan, progress_callback)
 
-                # 加入白名单
-                key = str(src).lower() if sys.platform == 'win32' else str(src)
+    def _run_one(self, path, st, batch_id):
+        if self._cancel_event.is_set(): return None
+        return self.process_file(path, force=True, batch_id=batch_id, st=st)
+
+    def undo_last_action(self, progress_callback=None):
+        batch_id = HistoryManager.last_batch_id()
+        if batch_id is None: return False, "无可撤销操作"
+        return self.undo_batch(batch_id, progress_callback)
+
+    def undo_batch(self, batch_id, progress_callback=None):
+        """撤销任意一个批次"""
+        records = HistoryManager.get_batch(batch_id)
+        if not records: return False, "未找到该批次"
+        return self._undo_records(records, progress_callback)
+
+    def undo_since(self, timestamp, progress_callback=None):
+        """撤销 timestamp 之后的全部操作"""
+        records = HistoryManager.records_since(timestamp)
+        if not records: return False, "该时间之后没有可撤销的操作"
+        return self._undo_records(records, progress_callback)
+
+    def _undo_records(self, records, progress_callback=None):
+        """
+        在线程池中并行还原文件
+        只有真正还原成功 (或目标文件已不存在、无法还原) 的记录才会从历史中删除，
+        其余失败的记录保留以便再次撤销
+        """
+        claim_lock = threading.Lock()
+        claimed = set()
+
+        def restore_path(src):
+            # 原位置已被占用时改名为 name_undo / name_undo2 ...，并发时不会选到同一个名字
+            with claim_lock:
+                candidate, n = src, 1
+                while self._path_key(candidate) in claimed or candidate.exists():
+                    suffix = "_undo" if n == 1 else f"_undo{n}"
+                    candidate = src.parent / f"{src.stem}{suffix}{src.suffix}"
+                    n += 1
+                claimed.add(self._path_key(candidate))
+                return candidate
+
+        def restore(rec):
+            if self._cancel_event.is_set():
+                return "cancelled"  # 未处理的记录保留在历史中，可再次撤销
+            tgt = Path(rec['target'])
+            if not tgt.exists():
+                return "stale"
+            src = restore_path(Path(rec['source']))
+            src.parent.mkdir(parents=True, exist_ok=True)
+
+            # 加入白名单
+            key = self._path_key(src)
+            with self.ignore_lock:
+                self.ignore_next_paths.add(key)
+            try:
+                self.mover.move(tgt, src)
+            except Exception:
                 with self.ignore_lock:
-                    self.ignore_next_paths.add(key)
+                    self.ignore_next_paths.discard(key)
+                raise
+            self.dir_cache.release(tgt)
+            return "ok"
+
+        self._cancel_event.clear()
+        done_ids = []
+        success = fail = stale = skipped = done = 0
+        total = len(records)
+        workers = self.config.get("undo_workers", 8)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ZenFile-Undo") as pool:
+            futures = {pool.submit(restore, rec): rec for rec in reversed(records)}
+            for fut in as_completed(futures):
+                rec = futures[fut]
+                try:
+                    state = fut.result()
+                except Exception as e:
+                    state = "fail"
+                    self.logger.error(f"撤销失败 {rec.get('target')}: {e}")
+                if state == "ok":
+                    success += 1
+                    done_ids.append(rec["id"])
+                elif state == "stale":
+                    stale += 1
+                    done_ids.append(rec["id"])
+                elif state == "cancelled":
+                    skipped += 1
+                else:
+                    fail += 1
+                done += 1
+                if progress_callback:
+                    try:
+                        progress_callback(done, total)
+                    except Exception:
+                        pass
 
-                shutil.move(str(tgt), str(src))
-                success += 1
-            except:
-                fail += 1
-        return True, f"成功撤销 {success} 个，失败 {fail} 个"
\ No newline at end of file
+        HistoryManager.remove_records(done_ids)
+        msg = f"成功撤销 {success} 个，失败 {fail} 个"
+        if stale: msg += f"，{stale} 个文件已不存在"
+        if skipped: msg += f"，已取消 {skipped} 个"
+        self.logger.info(msg)
+        return True, msg
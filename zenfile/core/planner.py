@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from .dircache import DirectoryCache
+from .history import HistoryManager
+from zenfile.utils.metrics import metrics
+
+
+class OrganizePlan:
+    """
+    整理计划：每一项为 {"source", "target", "folder", "size", "mtime_ns"}
+    target 已在计划阶段解决好同名冲突；skipped 为按原因统计的未整理文件数
+    """
+
+    def __init__(self, items=None, skipped=None, batch_id=None, created=None):
+        self.items = items or []
+        self.skipped = skipped or {}
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.created = created or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def groups(self):
+        """按目标目录分组"""
+        groups = {}
+        for item in self.items:
+            groups.setdefault(str(Path(item["target"]).parent), []).append(item)
+        return groups
+
+    def summary(self):
+        categories = {}
+        for item in self.items:
+            categories[item["folder"]] = categories.get(item["folder"], 0) + 1
+        return {
+            "moves": len(self.items),
+            "renamed": sum(1 for i in self.items if Path(i["target"]).name != Path(i["source"]).name),
+            "bytes": sum(i["size"] for i in self.items),
+            "folders": len(self.groups()),
+            "categories": categories,
+            "skipped": dict(self.skipped),
+        }
+
+    def to_dict(self):
+        return {"batch_id": self.batch_id, "created": self.created,
+                "summary": self.summary(), "items": self.items}
+
+    def export(self, path):
+        """导出报告：.csv 后缀为表格，其余为 JSON (可用 load 读回后再执行)"""
+        path = Path(path)
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", encoding="utf-8-sig", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["source", "target", "folder", "size", "mtime_ns"])
+                writer.writeheader()
+                writer.writerows(self.items)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("items", []), data.get("summary", {}).get("skipped"),
+                   data.get("batch_id"), data.get("created"))
+
+
+class Planner:
+    """
+    两阶段整理
+    - plan: 扫描全部监控目录、批量匹配规则、预先解决所有目标文件名，不修改文件系统
+    - apply: 按目标目录分组执行，每个目录只 mkdir 一次、只写一次移动日志，整批只提交一次历史记录
+    """
+
+    def __init__(self, organizer):
+        self.organizer = organizer
+
+    # ---------- 计划 ----------
+    def plan(self, progress_callback=None):
+        org = self.organizer
+        start = time.perf_counter()
+        org._cancel_event.clear()
+        rules = org.rules  # 整个计划使用同一份规则快照
+        files = self._scan(rules)
+
+        skipped = {}
+        candidates = []
+        with org.ignore_lock:
+            ignored = set(org.ignore_next_paths)
+        exe = Path(sys.executable) if getattr(sys, 'frozen', False) else None
+        for path, st in files:
+            p = Path(path)
+            if p.name.startswith(".") or p.name.startswith("~$") or p == exe:
+                skipped["hidden"] = skipped.get("hidden", 0) + 1
+            elif org._path_key(p) in ignored:
+                skipped["whitelist"] = skipped.get("whitelist", 0) + 1
+            else:
+                candidates.append((p, st))
+
+        results = rules.matcher.match_many([p for p, _ in candidates], [st for _, st in candidates])
+
+        # 虚拟预留：用独立的目录缓存解决重名，只读取目录，不创建任何文件
+        names = DirectoryCache()
+        items = []
+        for (p, st), (ignore, folder) in zip(candidates, results):
+            if ignore:
+                skipped["ignored"] = skipped.get("ignored", 0) + 1
+                continue
+            target = names.reserve(p.parent / folder, p.name)
+            items.append({"source": str(p), "target": str(target), "folder": folder,
+                          "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+            if progress_callback:
+                try:
+                    progress_callback(len(items), len(candidates))
+                except Exception:
+                    pass
+
+        plan = OrganizePlan(items, skipped)
+        s = plan.summary()
+        org.logger.info(f"整理计划: 扫描 {len(files)} 个文件，计划移动 {s['moves']} 个 (重命名 {s['renamed']} 个)，"
+                        f"涉及 {s['folders']} 个目标文件夹，耗时 {time.perf_counter() - start:.2f}s")
+        return plan
+
+    def _scan(self, rules):
+        """并发扫描所有监控目录 (递归范围内的子目录逐层展开)，返回 [(路径, stat)]"""
+        org = self.organizer
+        files = []
+        frontier = [(d, org.scope_for(d)) for d in rules.watch_dirs if d.exists()]
+        workers = rules.config.get("run_now_workers", 8)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ZenFile-Plan") as pool:
+            while frontier and not org._cancel_event.is_set():
+                futures = {pool.submit(org._scan_dir, d, scope): (d, scope) for d, scope in frontier}
+                frontier = []
+                for fut in as_completed(futures):
+                    d, scope = futures[fut]
+                    try:
+                        found, subdirs = fut.result()
+                    except Exception as e:
+                        org.logger.error(f"扫描失败 {d}: {e}")
+                        continue
+                    files += found
+                    frontier += [(sub, scope) for sub in subdirs]
+        return files
+
+    # ---------- 执行 ----------
+    def apply(self, plan, progress_callback=None):
+        """
+        按计划执行；计划生成后发生变化 (已消失、内容变化、仍在写入) 的文件跳过
+        每个目标目录完成后立即提交该组的历史记录，中途退出时已完成的移动仍可撤销
+        返回: {"total", "moved", "skipped", "errors", "elapsed", "cancelled", "batch_id"}
+        """
+        org = self.organizer
+        start = time.perf_counter()
+        org._cancel_event.clear()
+        rules = org.rules
+        total = len(plan.items)
+        moved, skipped, errors = 0, {}, 0
+        done = 0
+
+        workers = rules.config.get("run_now_workers", 8)
+        with HistoryManager.live_batch(plan.batch_id), \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ZenFile-Apply") as pool:
+            futures = [pool.submit(self._apply_group, Path(d), items, plan.batch_id, rules.dedup_mode)
+                       for d, items in plan.groups().items()]
+            for fut in as_completed(futures):
+                group_moved, group_skipped, group_errors, count = fut.result()
+                moved += group_moved
+                errors += group_errors
+                for reason, n in group_skipped.items():
+                    skipped[reason] = skipped.get(reason, 0) + n
+                done += count
+                if progress_callback:
+                    try:
+                        progress_callback(done, total)
+                    except Exception:
+                        pass
+
+        result = {
+            "total": total,
+            "moved": moved,
+            "skipped": skipped,
+            "errors": errors,
+            "elapsed": time.perf_counter() - start,
+            "cancelled": org._cancel_event.is_set(),
+            "batch_id": plan.batch_id,
+        }
+        org.logger.info(f"<<< 按计划整理完成，移动 {result['moved']}/{total} 个，跳过 {sum(skipped.values())} 个，"
+                        f"失败 {errors} 个，耗时 {result['elapsed']:.2f}s")
+        return result
+
+    def _apply_group(self, target_dir, items, batch_id, dedup_mode):
+        """执行同一目标目录下的计划项，返回 (移动数, 跳过统计, 失败数, 处理数)"""
+        org = self.organizer
+        ready, skipped, errors, moved = [], {}, 0, 0
+        for item in items:
+            if org._cancel_event.is_set():
+                skipped["cancelled"] = skipped.get("cancelled", 0) + 1
+                continue
+            source = Path(item["source"])
+            try:
+                st = os.stat(source)
+            except FileNotFoundError:
+                skipped["missing"] = skipped.get("missing", 0) + 1
+                continue
+            if st.st_size != item["size"] or st.st_mtime_ns != item["mtime_ns"]:
+                skipped["changed"] = skipped.get("changed", 0) + 1
+                continue
+            key = org._path_key(source)
+            if not org.readiness.check(source, key, st):
+                org.readiness.forget(key)
+                skipped["busy"] = skipped.get("busy", 0) + 1
+                continue
+            ready.append((source, item["folder"], Path(item["target"])))
+        if not ready:
+            return moved, skipped, errors, len(items)
+
+        try:
+            # 每个目标目录只创建一次，且只在确实有文件要移入时创建
+            org.dir_cache.ensure_dir(target_dir)
+        except OSError as e:
+            org.logger.error(f"无法创建目录 {target_dir}: {e}")
+            return moved, skipped, errors + len(ready), len(items)
+
+        # 通过共享的目录缓存预留目标名，与监控线程、一键整理互不冲突；计划的名称已被占用时重新分配
+        planned = []
+        for source, folder, target in ready:
+            if not org.dir_cache.claim(target):
+                target = org.dir_cache.reserve(target_dir, source.name)
+            # 同名冲突时与实时整理一样按 dedup_mode 处理重复文件
+            if target.name != source.name and org.dedup and dedup_mode != "off":
+                handled = org._handle_duplicate(source, target, target_dir / source.name, folder, batch_id, dedup_mode)
+                if handled is True:
+                    moved += 1
+                    continue
+                if handled is False:
+                    skipped["duplicate"] = skipped.get("duplicate", 0) + 1
+                    continue
+            planned.append((source, folder, target))
+
+        # 整组意图一次落盘
+        with metrics.stage("journal"):
+            op_ids = org.journal.begin_many([(s, t) for s, _, t in planned], batch_id)
+        records, done_ids = [], []
+        for (source, folder, target), op_id in zip(planned, op_ids):
+            try:
+                timing = {}
+                target, method = org._place(source, target, batch_id, op_id=op_id, timing=timing)
+                metrics.inc("moves", {"method": method})
+                records.append((source, target, folder))
+                done_ids.append(timing["op_id"])
+            except Exception as e:
+                errors += 1
+                metrics.inc("errors", {"stage": "move"})
+                org.logger.error(f"移动失败 {source.name}: {e}")
+
+        # 每组提交一次历史记录，可通过"撤销"整体还原
+        if records:
+            with metrics.stage("history"):
+                HistoryManager.add_records(records, batch_id)
+            org.journal.done(*done_ids)
+        return moved + len(records), skipped, errors, len(items)
@@ -0,0 +1,152 @@
+import heapq
+import os
+import stat
+import sys
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ReadinessChecker:
+    """
+    判断文件是否已写入完成
+    - 大小与修改时间两次观察一致，或修改时间已超过 settle_time，视为稳定
+    - 稳定后再做一次独占打开探测，仍被其他进程占用则视为未就绪
+    """
+
+    def __init__(self, settle_time=2.0):
+        self.settle_time = settle_time
+        self._seen = {}  # key -> (size, mtime_ns)
+        self._lock = threading.Lock()
+
+    def check(self, path, key, st=None):
+        st = st or os.stat(path)
+        sig = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            prev = self._seen.get(key)
+            stable = prev == sig or (time.time() - st.st_mtime) >= self.settle_time
+            if not stable or not self._probe(path, st):
+                self._seen[key] = sig
+                return False
+            self._seen.pop(key, None)
+            return True
+
+    def forget(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
+
+    @staticmethod
+    def _probe(path, st):
+        # Windows 下写入方通常不共享写权限，以读写方式打开即可探测占用
+        writable = bool(st.st_mode & stat.S_IWRITE)
+        flags = os.O_RDWR if sys.platform == 'win32' and writable else os.O_RDONLY
+        try:
+            fd = os.open(path, flags)
+        except OSError:
+            return False
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                except OSError:
+                    return False
+            return True
+        finally:
+            os.close(fd)
+
+
+class RetryQueue:
+    """定时重试队列：按指数退避延迟重新提交，超过最大次数后放弃；stop() 之后不再接受重试"""
+
+    def __init__(self, callback, base_delay=0.5, max_delay=30.0, max_attempts=10, logger=None):
+        self.callback = callback
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.logger = logger
+
+        self._attempts = {}  # key -> 已重试次数
+        self._due = {}       # key -> (到期时间, 参数)
+        self._heap = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def schedule(self, key, *args):
+        """安排一次重试；超过最大次数或已停止时返回 False"""
+        with self._cond:
+            if self._stopped:
+                return False
+            attempt = self._attempts.get(key, 0)
+            if attempt >= self.max_attempts:
+                self._attempts.pop(key, None)
+                return False
+            self._attempts[key] = attempt + 1
+            due = time.monotonic() + min(self.base_delay * (2 ** attempt), self.max_delay)
+            self._due[key] = (due, args)
+            heapq.heappush(self._heap, (due, key))
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._loop, name="ZenFile-Retry", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    def clear(self, key):
+        """文件处理成功或已消失时清除重试状态"""
+        with self._cond:
+            self._attempts.pop(key, None)
+            self._due.pop(key, None)
+
+    def stop(self):
+        """停止并丢弃尚未到期的重试，返回被丢弃的参数列表"""
+        with self._cond:
+            self._stopped = True
+            self._running = False
+            dropped = [args for _, args in self._due.values()]
+            self._due.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        return dropped
+
+    @property
+    def pending(self):
+        return len(self._due)
+
+    def _loop(self):
+        while True:
+            ready = []
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    while self._heap and self._heap[0][0] <= now:
+                        due, key = heapq.heappop(self._heap)
+                        entry = self._due.get(key)
+                        if entry and entry[0] == due:
+                            del self._due[key]
+                            ready.append(entry[1])
+                    if ready:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+            for args in ready:
+                try:
+                    self.callback(*args)
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"重试提交失败 {args[0] if args else ''}: {e}")
@@ -0,0 +1,91 @@
+import json
+import threading
+from pathlib import Path
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from zenfile.utils.config import CONFIG_PATH, validate_config
+
+
+class ConfigReloader(FileSystemEventHandler):
+    """
+    配置热重载：监听 settings.json，变化后防抖，读取并校验，
+    在定时器线程中编译新的规则快照，再交给 Organizer 原子替换、MonitorManager 按差异更新监控
+    格式错误或校验失败时保留当前配置
+    on_change(old_config, new_config): 可选回调 (如重新注册快捷键)
+    """
+
+    def __init__(self, organizer, monitor_manager=None, logger=None, debounce=0.5, on_change=None, path=CONFIG_PATH):
+        self.organizer = organizer
+        self.monitor_manager = monitor_manager
+        self.logger = logger
+        self.debounce = debounce
+        self.on_change = on_change
+        self.path = Path(path)
+        self.observer = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.observer: return self
+        try:
+            self.observer = Observer()
+            self.observer.schedule(self, str(self.path.parent), recursive=False)
+            self.observer.start()
+            if self.logger: self.logger.info("配置热重载已启用")
+        except Exception as e:
+            self.observer = None
+            if self.logger: self.logger.warning(f"无法监听配置文件: {e}")
+        return self
+
+    def stop(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def on_any_event(self, event):
+        # 只关心写入类事件；自身读取文件产生的 opened/closed_no_write 事件必须忽略
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"): return
+        paths = [event.src_path, getattr(event, "dest_path", None)]
+        if any(p and Path(p) == self.path for p in paths):
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.debounce, self.reload)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def reload(self):
+        """读取、校验并应用配置文件；返回是否应用了新配置"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                new_config = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            if self.logger: self.logger.warning(f"配置文件格式错误，保留当前配置: {e}")
+            return False
+        errors = validate_config(new_config)
+        if errors:
+            if self.logger: self.logger.warning(f"配置校验失败，保留当前配置: {'; '.join(errors)}")
+            return False
+
+        old_config = self.organizer.config
+        if dict(old_config) == new_config:
+            return False  # 内容未变 (如设置窗口保存时已直接生效)
+        try:
+            self.organizer.reload_config(new_config)
+            if self.monitor_manager:
+                self.monitor_manager.update_watches(new_config.get("watch_dirs", []))
+            if self.on_change:
+                self.on_change(old_config, self.organizer.config)
+        except Exception as e:
+            if self.logger: self.logger.error(f"应用新配置失败: {e}")
+            return False
+        if self.logger: self.logger.info("检测到配置文件变化，已重新加载")
+        return True
@@ -1,31 +1,244 @@
+import fnmatch
+import re
+from collections import deque
+from pathlib import Path
+from .sniff import ContentSniffer, DEFAULT_CONTENT_RULES
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick 多模式匹配：一次扫描文件名即可找出所有命中的关键词
+    每个关键词带一个优先级 (数字越小越优先)，search 返回命中的最高优先级
+    """
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [None]  # 以该节点结尾 (含 fail 链) 的最高优先级
+
+        for priority, word in keywords:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(None)
+                node = nxt
+            if self.out[node] is None or priority < self.out[node]:
+                self.out[node] = priority
+
+        # BFS 构建失败指针，并沿 fail 链合并输出
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                inherited = self.out[self.fail[nxt]]
+                if inherited is not None and (self.out[nxt] is None or inherited < self.out[nxt]):
+                    self.out[nxt] = inherited
+                queue.append(nxt)
+
+    def search(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        best = out[0]  # 空关键词匹配任何文件名
+        if best == 0: return best
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            p = out[node]
+            if p is not None and (best is None or p < best):
+                best = p
+                if best == 0: break  # 已是最高优先级
+        return best
+
+
+def _pattern_to_regex(pattern):
+    """
+    将单条模式转换为正则片段
+    - "re:..." 为正则表达式 (区分大小写，需要时用 (?i:...) 局部指定)
+    - 其余视为 glob (如 IMG_*.HEIC)，不区分大小写
+    """
+    if pattern.startswith("re:"):
+        return f"(?:{pattern[3:]})"
+    # fnmatch.translate 生成 (?s:...)\Z，这里只取主体
+    body = fnmatch.translate(pattern)
+    if body.startswith("(?s:") and body.endswith(")\\Z"):
+        body = body[4:-3]
+    return f"(?si:{body})"
+
+
+# 命名分组、反向引用、条件分组：合并后分组名/编号会冲突或错位，需单独编译
+_ISOLATE = re.compile(r"\(\?P[<=]|\\[1-9]|\(\?\(")
+
+
+class PatternSet:
+    """
+    多条 glob/正则模式合并为一个交替正则，一次 fullmatch 得出结果
+    - 每条模式对应一个命名分组 p<序号>，lastgroup 即命中的模式
+    - 交替按顺序尝试，第一个能完整匹配的分支胜出
+    - 含命名分组或反向引用的正则不参与合并，单独编译后按原顺序参与匹配
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._segments = []  # [(正则, 模式序号)]；序号为 None 表示合并段，由 lastgroup 得出
+        parts = []
+        for i, pattern in enumerate(self.patterns):
+            body = _pattern_to_regex(pattern)
+            try:
+                regex = re.compile(body)
+            except re.error:
+                continue  # 无效的正则直接跳过，不影响其他模式
+            if _ISOLATE.search(body):
+                self._flush(parts)
+                parts = []
+                self._segments.append((regex, i))
+            else:
+                parts.append((i, body))
+        self._flush(parts)
+
+    def _flush(self, parts):
+        if not parts: return
+        try:
+            self._segments.append((re.compile("|".join(f"(?P<p{i}>{body})" for i, body in parts)), None))
+        except re.error:
+            # 合并失败 (如全局标志位置不合法) 时退回逐条匹配
+            for i, body in parts:
+                try:
+                    self._segments.append((re.compile(body), i))
+                except re.error:
+                    pass
+
+    def first(self, name):
+        """返回第一个匹配的模式序号，无匹配返回 None"""
+        for regex, index in self._segments:
+            m = regex.fullmatch(name)
+            if m:
+                return int(m.lastgroup[1:]) if index is None else index
+        return None
+
+
+class IgnoreMatcher:
+    """
+    gitignore 风格的忽略规则：后出现的规则覆盖先出现的，"!" 开头表示取反
+    通过倒序合并成一个 PatternSet，第一个命中的就是"最后一条匹配规则"
+    """
+
+    def __init__(self, patterns):
+        rules = []
+        for raw in patterns:
+            negate = raw.startswith("!")
+            rules.append((negate, raw[1:] if negate else raw))
+        rules.reverse()
+        self._negate = [n for n, _ in rules]
+        self._set = PatternSet(p for _, p in rules)
+
+    def decide(self, name):
+        """True=忽略, False=明确不忽略 (取反), None=未命中任何规则"""
+        hit = self._set.first(name)
+        if hit is None: return None
+        return not self._negate[hit]
+
+
 class RuleMatcher:
+    DEFAULT_FOLDER = "99_其他"
+
     def __init__(self, config):
         self.rules = config.get("rules", {})
         # 新增：关键词规则
         self.keyword_rules = config.get("keyword_rules", {})
         self.ignore_exts = config.get("ignore_exts", [])
+        # glob/正则模式规则：{模式: 目标文件夹}，按配置顺序优先
+        self.pattern_rules = config.get("pattern_rules", {})
+        # gitignore 风格忽略规则，支持 "!" 取反
+        self.ignore_patterns = config.get("ignore_patterns", [])
+        # 可选：按文件头识别类型，仅在名称规则全部落空时使用
+        self.content_sniffing = config.get("content_sniffing", False)
+        self.content_rules = dict(DEFAULT_CONTENT_RULES, **config.get("content_rules", {}))
+        self.sniffer = ContentSniffer() if self.content_sniffing else None
+        self._compile()
+
+    def _compile(self):
+        """预编译规则：后缀 -> 文件夹哈希表，关键词 -> AC 自动机，模式 -> 合并正则"""
+        self._ignore_set = frozenset(self.ignore_exts)
+        self._ignore_matcher = IgnoreMatcher(self.ignore_patterns) if self.ignore_patterns else None
+        self._pattern_folders = list(self.pattern_rules.values())
+        self._pattern_set = PatternSet(self.pattern_rules) if self.pattern_rules else None
+
+        # 保持原有语义：同一后缀出现在多个文件夹时，先出现的生效
+        self._ext_map = {}
+        for folder, ext_list in self.rules.items():
+            for ext in ext_list:
+                self._ext_map.setdefault(ext, folder)
+
+        # 关键词按配置顺序作为优先级
+        self._keyword_folders = list(self.keyword_rules.values())
+        self._automaton = KeywordAutomaton(
+            (i, keyword.lower()) for i, keyword in enumerate(self.keyword_rules)
+        ) if self.keyword_rules else None
 
-    def match(self, file_path):
+    def match(self, file_path, st=None):
         """
         根据规则匹配目标文件夹
+        st: 可选的 os.stat 结果，供内容识别复用
         返回: (是否忽略, 目标文件夹名)
         """
-        filename = file_path.name.lower()
+        ext = file_path.suffix.lower()
+        name = file_path.name
 
-        # 1. 检查忽略后缀
-        if file_path.suffix.lower() in self.ignore_exts:
+        # 1. 检查忽略规则：忽略模式优先 ("!" 可放行被后缀忽略的文件)，其次忽略后缀
+        decision = self._ignore_matcher.decide(name) if self._ignore_matcher else None
+        if decision is None:
+            decision = ext in self._ignore_set
+        if decision:
             return True, None
 
-        # 2. 优先匹配关键词 (Smart Match)
-        for keyword, folder in self.keyword_rules.items():
-            if keyword.lower() in filename:
-                return False, folder
+        # 2. glob/正则模式规则
+        if self._pattern_set:
+            hit = self._pattern_set.first(name)
+            if hit is not None:
+                return False, self._pattern_folders[hit]
 
-        # 3. 匹配后缀名 (Extension Match)
-        ext = file_path.suffix.lower()
-        for folder, ext_list in self.rules.items():
-            if ext in ext_list:
+        # 3. 优先匹配关键词 (Smart Match)
+        if self._automaton:
+            hit = self._automaton.search(name.lower())
+            if hit is not None:
+                return False, self._keyword_folders[hit]
+
+        # 4. 匹配后缀名 (Extension Match)
+        folder = self._ext_map.get(ext)
+        if folder is not None:
+            return False, folder
+
+        # 5. 内容识别 (文件头魔数)
+        if self.sniffer:
+            kind = self.sniffer.sniff(file_path, st)
+            folder = self.content_rules.get(kind) if kind else None
+            if folder:
                 return False, folder
 
-        # 4. 默认归类
-        return False, "99_其他"
\ No newline at end of file
+        # 6. 默认归类
+        return False, self.DEFAULT_FOLDER
+
+    def category_roots(self):
+        """本规则集可能创建的顶层分类文件夹名 (如 02_文档/合同 -> 02_文档)"""
+        folders = list(self.rules) + list(self.keyword_rules.values()) + list(self.pattern_rules.values())
+        folders.append(self.DEFAULT_FOLDER)
+        if self.sniffer:
+            folders += list(self.content_rules.values())
+        return {Path(f).parts[0] for f in folders if f and Path(f).parts}
+
+    def match_many(self, file_paths, stats=None):
+        """批量匹配，供批量扫描使用；stats 为可选的对应 stat 列表，返回与输入顺序一致的结果列表"""
+        match = self.match
+        if stats is None:
+            return [match(p) for p in file_paths]
+        return [match(p, st) for p, st in zip(file_paths, stats)]
@@ -0,0 +1,37 @@
+import copy
+from pathlib import Path
+from types import MappingProxyType
+from .rules import RuleMatcher
+from .scope import build_scopes
+
+
+class RuleSet:
+    """
+    一份配置编译后的不可变快照：配置、规则匹配器、生效的监控目录与监控范围
+    编译在调用方线程完成；Organizer 只做一次属性赋值来切换快照，
+    工作线程每个文件读取一次引用，不需要加锁，也不会看到新旧混合的配置
+    """
+
+    __slots__ = ("config", "matcher", "watch_dirs", "scopes", "dedup_mode")
+
+    def __init__(self, config):
+        # 深拷贝一份，调用方之后修改自己的 dict 不会影响快照
+        config = copy.deepcopy(dict(config))
+        matcher = RuleMatcher(config)
+        watch_dirs = []
+        for p in config.get("watch_dirs", []):
+            try:
+                path_obj = Path(p)
+                if path_obj.exists():
+                    watch_dirs.append(path_obj)
+            except Exception:
+                pass
+        object.__setattr__(self, "config", MappingProxyType(config))
+        object.__setattr__(self, "matcher", matcher)
+        object.__setattr__(self, "watch_dirs", tuple(watch_dirs))
+        # 每个监控目录的范围 (递归/深度/排除)，自动排除分类文件夹
+        object.__setattr__(self, "scopes", MappingProxyType(build_scopes(config, matcher.category_roots())))
+        object.__setattr__(self, "dedup_mode", config.get("dedup_mode", "off"))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RuleSet 为只读快照")
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+from .rules import PatternSet
+
+
+class WatchScope:
+    """
+    单个监控根目录的范围
+    - recursive: 是否处理子目录；max_depth: 最大子目录深度 (根目录为 0，None 表示不限)
+    - exclude: 目录排除 glob，对目录名和相对路径 (以 / 分隔) 生效
+    - excluded_names: ZenFile 自己的分类文件夹 (01_图片 ...)，任意层级都不进入
+    """
+
+    def __init__(self, root, options=None, excluded_names=()):
+        options = options or {}
+        self.root = Path(root)
+        self.recursive = bool(options.get("recursive", False))
+        self.max_depth = options.get("max_depth", 3)
+        self.excluded_names = frozenset(excluded_names)
+        self._exclude = PatternSet(options.get("exclude", []))
+        # 用于判断配置变化后是否需要重建该根目录的监控
+        self.signature = (self.recursive, self.max_depth, tuple(self._exclude.patterns), self.excluded_names)
+
+    def relative_parts(self, path):
+        """path 相对根目录的各级名称；不在根目录下返回 None"""
+        try:
+            return Path(path).relative_to(self.root).parts
+        except ValueError:
+            return None
+
+    def contains(self, path):
+        return self.relative_parts(path) is not None
+
+    def allows(self, dir_path):
+        """该目录是否在监控/整理范围内"""
+        parts = self.relative_parts(dir_path)
+        if parts is None: return False
+        if not parts: return True
+        if not self.recursive: return False
+        if self.max_depth is not None and len(parts) > self.max_depth: return False
+        for i, name in enumerate(parts):
+            if name in self.excluded_names: return False
+            if self._exclude.first(name) is not None: return False
+            if i and self._exclude.first("/".join(parts[:i + 1])) is not None: return False
+        return True
+
+    def walk(self, start=None):
+        """从 start (默认根目录) 开始列出范围内的全部目录，不进入被排除的子树"""
+        start = Path(start) if start else self.root
+        if not self.allows(start): return
+        stack = [start]
+        while stack:
+            d = stack.pop()
+            yield d
+            if not self.recursive: continue
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and self.allows(entry.path):
+                            stack.append(Path(entry.path))
+            except OSError:
+                pass
+
+
+def build_scopes(config, category_names):
+    """根据配置为每个监控目录生成 WatchScope，键为规范化后的路径字符串"""
+    options = {str(Path(k)): v for k, v in config.get("watch_options", {}).items()}
+    scopes = {}
+    for p in config.get("watch_dirs", []):
+        key = str(Path(p))
+        scopes[key] = WatchScope(key, options.get(key), category_names)
+    return scopes
@@ -0,0 +1,65 @@
+import json
+import os
+from zenfile.utils.config import SNAPSHOT_PATH
+
+
+class SnapshotStore:
+    """
+    监控目录快照：记录每个目录自身的修改时间，以及其中文件的 (inode, 大小, 修改时间)
+    启动时与上次快照对比，只整理新增或变化的文件；目录修改时间未变的直接跳过
+    格式: {目录: {"mtime": ns, "entries": {文件名: [inode, size, mtime_ns]}}}
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+
+    def load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save(self, snapshots):
+        tmp = self.path.with_suffix(".json.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshots, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"保存目录快照失败: {e}")
+
+    @staticmethod
+    def capture(directory):
+        """读取目录当前状态"""
+        dir_mtime = os.stat(directory).st_mtime_ns
+        entries = {}
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        entries[entry.name] = [st.st_ino, st.st_size, st.st_mtime_ns]
+                except OSError:
+                    pass
+        return {"mtime": dir_mtime, "entries": entries}
+
+    @staticmethod
+    def diff(directory, old):
+        """
+        与旧快照对比
+        返回 (新增或变化的文件路径列表, 新快照)；目录未变化时返回 ([], old)
+        没有旧快照时只建立基线，不返回任何文件 (与以前"启动时不处理已有文件"的行为一致)
+        """
+        if old and os.stat(directory).st_mtime_ns == old.get("mtime"):
+            # 目录修改时间未变：没有文件增删改名，跳过整个目录
+            return [], old
+        snap = SnapshotStore.capture(directory)
+        if not old:
+            return [], snap
+        old_entries = old.get("entries", {})
+        changed = [os.path.join(directory, name) for name, sig in snap["entries"].items()
+                   if old_entries.get(name) != sig]
+        return changed, snap
@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+
+HEADER_SIZE = 4096
+
+# 文件类型 -> 默认目标文件夹 (与默认后缀规则保持一致)
+DEFAULT_CONTENT_RULES = {
+    "image": "01_图片",
+    "document": "02_文档",
+    "video": "03_视频",
+    "audio": "04_音频",
+    "archive": "05_压缩包",
+    "executable": "06_安装包",
+}
+
+# (偏移, 魔数, 类型)
+SIGNATURES = [
+    (0, b"\x89PNG\r\n\x1a\n", "image"),
+    (0, b"\xff\xd8\xff", "image"),
+    (0, b"GIF87a", "image"),
+    (0, b"GIF89a", "image"),
+    (0, b"%PDF-", "document"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "document"),  # doc/xls/ppt (OLE)
+    (0, b"{\\rtf", "document"),
+    (0, b"Rar!\x1a\x07", "archive"),
+    (0, b"7z\xbc\xaf\x27\x1c", "archive"),
+    (0, b"\x1f\x8b", "archive"),
+    (0, b"BZh", "archive"),
+    (0, b"\xfd7zXZ\x00", "archive"),
+    (257, b"ustar", "archive"),
+    (0, b"MZ", "executable"),
+    (0, b"ID3", "audio"),
+    (0, b"fLaC", "audio"),
+    (0, b"OggS", "audio"),
+    (0, b"\x1a\x45\xdf\xa3", "video"),  # mkv/webm
+    (0, b"FLV", "video"),
+]
+
+# ISO 媒体 (ftyp) 品牌
+_FTYP_BRANDS = {
+    b"heic": "image", b"heix": "image", b"mif1": "image", b"msf1": "image", b"avif": "image",
+    b"M4A ": "audio", b"M4B ": "audio",
+}
+
+# RIFF 子类型
+_RIFF_TYPES = {b"WEBP": "image", b"WAVE": "audio", b"AVI ": "video"}
+
+# Office Open XML 内部目录
+_OOXML_MARKERS = (b"word/", b"xl/", b"ppt/", b"[Content_Types].xml")
+
+
+def detect(header):
+    """根据文件头字节判断类型，无法识别返回 None"""
+    if header[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(header[8:12], "video")
+    if header[:4] == b"RIFF":
+        return _RIFF_TYPES.get(header[8:12])
+    if header[:4] == b"PK\x03\x04":
+        # docx/xlsx/pptx 本质是 zip，看本地文件头里的条目名区分
+        return "document" if any(m in header for m in _OOXML_MARKERS) else "archive"
+    for offset, magic, kind in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return kind
+    return None
+
+
+class ContentSniffer:
+    """
+    基于文件头魔数的类型识别
+    - 只读取前 HEADER_SIZE 字节
+    - 结果按 (路径, 设备, inode, 大小, 修改时间) 缓存在有界 LRU 中，重复事件无需再读文件
+      (Windows 下 DirEntry.stat() 的设备号与 inode 为 0，必须带上路径，否则同大小同时间的文件会共用结果)
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sniff(self, path, st=None):
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return None
+        key = (str(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        kind = None
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            try:
+                kind = detect(os.read(fd, HEADER_SIZE))
+            finally:
+                os.close(fd)
+        except OSError:
+            return None  # 读取失败不缓存，下次再试
+
+        with self._lock:
+            self._cache[key] = kind
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return kind
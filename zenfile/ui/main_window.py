@@ -1,3 +1,6 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from tkinter import messagebox, filedialog, ttk
 from PIL import Image
 import tkinter as tk
@@ -18,6 +21,10 @@ COLOR_ORANGE = "#F29F3F"  # 撤销
 COLOR_RED = "#FF4D4F"  # 删除
 COLOR_BORDER = "#E1E4E8"  # 边框颜色
 
+LOG_PAGE_SIZE = 50  # 操作日志每次加载的条数，滚动到底部时再加载下一页
+ALL_CATEGORIES = "全部分类"
+TIME_RANGES = {"全部时间": None, "今天": 0, "最近 7 天": 7, "最近 30 天": 30}
+
 # 设置全局主题配置
 ctk.set_appearance_mode("light")
 ctk.set_default_color_theme("blue")
@@ -30,7 +37,8 @@ class SettingsWindow:
         self.organizer = organizer
         self.monitor_mgr = monitor_mgr
         self.hotkey_mgr = hotkey_mgr
-        self.config = organizer.config
+        # 编辑用的副本：Organizer 持有的是只读快照，保存时再整体重新加载
+        self.config = copy.deepcopy(dict(organizer.config))
 
         self.window.title("设置")
         try:
@@ -50,6 +58,20 @@ class SettingsWindow:
         self.dashboard_dir_container = None
         self.full_log_tree = None
         self.full_dirs_container = None
+        self.log_category = None
+        self.log_time_range = None
+
+        # 操作日志分页状态
+        self._log_page = 0
+        self._log_has_more = False
+        self._log_loading = False
+        self._log_load_scheduled = False  # 已排队等待加载下一页
+
+        # 后台任务 (立即整理/撤销)：在单线程执行器中运行，进度经 window.after 回到界面线程
+        self._executor = None
+        self._task_title = None
+        self._progress = (0, 0)
+        self._progress_scheduled = False
 
         self.watch_dirs_data = list(self.config.get("watch_dirs", []))
 
@@ -236,19 +258,34 @@ class SettingsWindow:
         btn_row = ctk.CTkFrame(cmd_card, fg_color="transparent")
         btn_row.pack(fill="x", padx=20, pady=20)
 
-        ctk.CTkButton(
+        self.run_btn = ctk.CTkButton(
             btn_row, text="立即整理",
             command=self.run_now,
             fg_color=COLOR_BLUE, hover_color="#327AC0",
             height=45, font=("Microsoft YaHei UI", 13, "bold")
-        ).pack(side="left", fill="x", expand=True, padx=(0, 10))
+        )
+        self.run_btn.pack(side="left", fill="x", expand=True, padx=(0, 10))
 
-        ctk.CTkButton(
+        self.undo_btn = ctk.CTkButton(
             btn_row, text="撤销操作",
             command=self.undo,
             fg_color=COLOR_ORANGE, hover_color="#D98B34",
             height=45, font=("Microsoft YaHei UI", 13, "bold")
-        ).pack(side="left", fill="x", expand=True, padx=(10, 0))
+        )
+        self.undo_btn.pack(side="left", fill="x", expand=True, padx=(10, 0))
+
+        # 进度条：仅在后台任务运行时显示
+        self.progress_frame = ctk.CTkFrame(cmd_card, fg_color="transparent")
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text="", font=("Microsoft YaHei UI", 12),
+                                           text_color=COLOR_TEXT_SUB)
+        self.progress_label.pack(anchor="w")
+        progress_row = ctk.CTkFrame(self.progress_frame, fg_color="transparent")
+        progress_row.pack(fill="x", pady=(5, 0))
+        self.progress_bar = ctk.CTkProgressBar(progress_row, progress_color=COLOR_BLUE)
+        self.progress_bar.pack(side="left", fill="x", expand=True)
+        self.cancel_btn = ctk.CTkButton(progress_row, text="取消", command=self.cancel_task, width=60, height=28,
+                                        fg_color="transparent", border_width=1, text_color="gray")
+        self.cancel_btn.pack(side="right", padx=(10, 0))
 
         # Right Column: C. 监控目录
         right_col = ctk.CTkFrame(top_section, fg_color="transparent")
@@ -305,14 +342,23 @@ class SettingsWindow:
         ctk.CTkButton(header, text="刷新列表", command=self.refresh_full_logs, width=80, fg_color="transparent",
                       border_width=1, text_color="gray").pack(side="right")
 
+        # 筛选：分类与时间范围在查询中过滤
+        self.log_time_range = ctk.CTkOptionMenu(header, values=list(TIME_RANGES), width=120,
+                                                command=lambda _: self.refresh_full_logs())
+        self.log_time_range.pack(side="right", padx=(0, 10))
+        self.log_category = ctk.CTkOptionMenu(header, values=[ALL_CATEGORIES], width=140,
+                                              command=lambda _: self.refresh_full_logs())
+        self.log_category.pack(side="right", padx=(0, 10))
+
         # 表格区域
         table_frame = ctk.CTkFrame(card, fg_color="transparent")
         table_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
 
-        # 使用复用函数创建全尺寸表格 (height 设大一点)
-        self.full_log_tree = self._create_scrolling_treeview(table_frame, height=15)
+        # 使用复用函数创建全尺寸表格 (height 设大一点)，滚动到底部时加载下一页
+        self.full_log_tree = self._create_scrolling_treeview(table_frame, height=15,
+                                                             on_scroll_end=self._schedule_load_more)
 
-    def _create_scrolling_treeview(self, parent, height):
+    def _create_scrolling_treeview(self, parent, height, on_scroll_end=None):
         columns = ("time", "type", "source", "target")
         tree = ttk.Treeview(parent, columns=columns, show="headings", style="Treeview", height=height)
 
@@ -322,7 +368,7 @@ class SettingsWindow:
         tree.column("target", width=350, anchor="w")
 
         tree.heading("time", text="时间")
-        tree.heading("type", text="类型")
+        tree.heading("type", text="分类")
         tree.heading("source", text="源文件")
         tree.heading("target", text="目标文件")
 
@@ -330,7 +376,12 @@ class SettingsWindow:
         ysb = ctk.CTkScrollbar(parent, orientation="vertical", command=tree.yview)
         xsb = ctk.CTkScrollbar(parent, orientation="horizontal", command=tree.xview)
 
-        tree.configure(yscrollcommand=ysb.set, xscrollcommand=xsb.set)
+        def on_yscroll(first, last):
+            ysb.set(first, last)
+            if on_scroll_end and float(last) >= 0.98:
+                on_scroll_end()
+
+        tree.configure(yscrollcommand=on_yscroll, xscrollcommand=xsb.set)
 
         ysb.pack(side="right", fill="y")
         xsb.pack(side="bottom", fill="x")
@@ -405,22 +456,59 @@ class SettingsWindow:
 
     # --- 日志刷新 ---
     def refresh_dashboard_logs(self):
-        self._refresh_logs_common(self.dashboard_tree, limit=10)
+        tree = self.dashboard_tree
+        if not tree: return
+        tree.delete(*tree.get_children())
+        self._insert_log_rows(tree, HistoryManager.query(page_size=10))
 
     def refresh_full_logs(self):
-        self._refresh_logs_common(self.full_log_tree, limit=100)
-
-    def _refresh_logs_common(self, tree_widget, limit):
-        if not tree_widget: return
-        for item in tree_widget.get_children():
-            tree_widget.delete(item)
+        """重新从第一页加载，筛选条件变化或手动刷新时调用"""
+        tree = self.full_log_tree
+        if not tree: return
+        tree.delete(*tree.get_children())
+        tree.yview_moveto(0)
+        categories = [ALL_CATEGORIES] + HistoryManager.categories()
+        self.log_category.configure(values=categories)
+        if self.log_category.get() not in categories:
+            self.log_category.set(ALL_CATEGORIES)
+        self._log_page = 0
+        self._log_has_more = True
+        self._load_more_logs()
+
+    def _schedule_load_more(self):
+        """滚动接近底部：排队加载下一页；一次滚动会连续触发多次回调，已排队时不再重复排队"""
+        if self._log_load_scheduled or self._log_loading or not self._log_has_more: return
+        self._log_load_scheduled = True
+        self.full_log_tree.after_idle(self._load_more_logs)
+
+    def _load_more_logs(self):
+        """追加下一页；只在滚动接近底部时触发，表格中只保留已浏览到的行"""
+        self._log_load_scheduled = False
+        if self._log_loading or not self._log_has_more or not self.full_log_tree: return
+        self._log_loading = True
         try:
-            history = HistoryManager.load_history()
-            if history:
-                for rec in reversed(history[-limit:]):
-                    tree_widget.insert("", "end", values=(
-                        rec.get("time", ""), "文件", rec.get("source", ""), rec.get("target", "")
-                    ))
+            category = self.log_category.get()
+            days = TIME_RANGES.get(self.log_time_range.get())
+            since = None
+            if days is not None:
+                since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+            records = HistoryManager.query(
+                page=self._log_page, page_size=LOG_PAGE_SIZE,
+                category=None if category == ALL_CATEGORIES else category, since=since
+            )
+            self._insert_log_rows(self.full_log_tree, records)
+            self._log_page += 1
+            self._log_has_more = len(records) == LOG_PAGE_SIZE
+        finally:
+            self._log_loading = False
+
+    def _insert_log_rows(self, tree_widget, records):
+        try:
+            for rec in records:
+                tree_widget.insert("", "end", values=(
+                    rec.get("time", ""), HistoryManager.category_of(rec) or "文件",
+                    rec.get("source", ""), rec.get("target", "")
+                ))
         except Exception as e:
             print(f"日志加载错误: {e}")
 
@@ -483,22 +571,72 @@ class SettingsWindow:
             self.refresh_dir_list_page()
 
     def run_now(self):
-        try:
-            c = self.organizer.run_now()
-            messagebox.showinfo("完成", f"已立即处理 {c} 个文件")
-            self.refresh_dashboard_logs()
-            self.refresh_full_logs()
-        except Exception as e:
-            messagebox.showerror("错误", str(e))
+        def on_done(r):
+            state = "已取消" if r["cancelled"] else "完成"
+            messagebox.showinfo(state, f"已处理 {r['total']} 个文件，移动 {r['moved']} 个，耗时 {r['elapsed']:.1f} 秒")
+        self._start_task("正在整理", self.organizer.run_now, on_done)
 
     def undo(self):
+        self._start_task("正在撤销", self.organizer.undo_last_action, lambda r: messagebox.showinfo("操作结果", r[1]))
+
+    def cancel_task(self):
+        self.organizer.cancel_run()
+        self.cancel_btn.configure(state="disabled")
+        self.progress_label.configure(text=f"{self._task_title}，取消中...")
+
+    # --- 后台任务 ---
+    def _start_task(self, title, func, on_done):
+        """在后台执行 func(progress_callback)，界面线程只负责刷新进度，完成后回调 on_done(结果)"""
+        if self._task_title: return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ZenFile-UI")
+        self._task_title = title
+        self._progress = (0, 0)
+        self.run_btn.configure(state="disabled")
+        self.undo_btn.configure(state="disabled")
+        self.cancel_btn.configure(state="normal")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text=f"{title}...")
+        self.progress_frame.pack(fill="x", padx=20, pady=(0, 20))
+
+        future = self._executor.submit(func, self._report_progress)
+        future.add_done_callback(lambda f: self._call_in_ui(self._finish_task, f, on_done))
+
+    def _call_in_ui(self, func, *args):
+        try:
+            self.window.after(0, func, *args)
+        except Exception:
+            pass  # 窗口已关闭，任务结果只记录在日志中
+
+    def _report_progress(self, done, total):
+        """工作线程中调用：只保存最新进度，合并为每 100ms 至多一次界面刷新"""
+        self._progress = (done, total)
+        if not self._progress_scheduled:
+            self._progress_scheduled = True
+            try:
+                self.window.after(100, self._update_progress)
+            except Exception:
+                pass
+
+    def _update_progress(self):
+        self._progress_scheduled = False
+        if not self._task_title: return
+        done, total = self._progress
+        self.progress_bar.set(done / total if total else 0)
+        if self.cancel_btn.cget("state") != "disabled":
+            self.progress_label.configure(text=f"{self._task_title} {done}/{total}")
+
+    def _finish_task(self, future, on_done):
+        self._task_title = None
+        self.progress_frame.pack_forget()
+        self.run_btn.configure(state="normal")
+        self.undo_btn.configure(state="normal")
         try:
-            s, m = self.organizer.undo_last_action()
-            messagebox.showinfo("操作结果", m)
-            self.refresh_dashboard_logs()
-            self.refresh_full_logs()
+            on_done(future.result())
         except Exception as e:
             messagebox.showerror("错误", str(e))
+        self.refresh_dashboard_logs()
+        self.refresh_full_logs()
 
     def tog_run(self):
         target_state = self.v_run.get()
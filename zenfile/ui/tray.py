@@ -8,9 +8,12 @@ from pystray import MenuItem as item
 from zenfile.utils.system import get_resource_path
 from pynput import keyboard
 from zenfile.utils.config import load_config
-from zenfile.utils.logger import setup_logger
+from zenfile.utils.logger import setup_logger, shutdown_logger
 from zenfile.core.organizer import Organizer
 from zenfile.core.monitor import MonitorManager
+from zenfile.core.history import HistoryManager
+from zenfile.core.reloader import ConfigReloader
+from zenfile.utils.metrics import MetricsExporter
 
 if platform.system() == "Windows":
     import win32event, win32api, winerror
@@ -148,8 +151,8 @@ def main():
             sys.exit(0)
 
     # 2. 基础配置
-    logger = setup_logger()
     config = load_config()
+    logger = setup_logger(config)
     logger.info(">>> ZenFile 启动")
 
     # 3. 核心对象初始化
@@ -167,13 +170,18 @@ def main():
     org = Organizer(config, logger)
     mon_mgr = MonitorManager(org, logger)
     mon_mgr.start(config.get("watch_dirs", []))
+    exporter = MetricsExporter(config, logger).start()
 
     # 4. 退出逻辑
     def shutdown():
         logger.info("退出中...")
         hk_mgr.stop()
         tray.stop_service()
+        reloader.stop()
         mon_mgr.stop()
+        exporter.stop()
+        HistoryManager.flush()
+        shutdown_logger()  # os._exit 不会触发 atexit，需手动写完日志队列
         try:
             root.quit()
         except:
@@ -187,6 +195,14 @@ def main():
     # 6. 启动
     hk_mgr.start(config.get("hotkey", "<ctrl>+<alt>+z"))
 
+    def on_config_change(old, new):
+        if old.get("hotkey") != new.get("hotkey"):
+            hk_mgr.restart(new.get("hotkey"))
+
+    reloader = ConfigReloader(org, mon_mgr, logger, on_change=on_config_change)
+    if config.get("config_hot_reload", True):
+        reloader.start()
+
     # 托盘图标必须在独立线程运行，否则会阻塞 GUI 主循环
     threading.Thread(target=tray.run, daemon=True).start()
 
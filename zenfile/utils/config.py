@@ -1,22 +1,31 @@
 import json
 import os
+import re
 from pathlib import Path
 
 # 定义全局路径
-# 1. 基础配置目录 (AppData/Roaming/ZenFile)
-BASE_DIR = Path(os.getenv('APPDATA')) / "ZenFile"
+# 1. 基础配置目录 (AppData/Roaming/ZenFile)；非 Windows (如 Linux 服务器) 使用 ~/.config/ZenFile
+BASE_DIR = Path(os.getenv('APPDATA') or os.getenv('XDG_CONFIG_HOME') or Path.home() / ".config") / "ZenFile"
 BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 # 2. 关键文件路径
 CONFIG_PATH = BASE_DIR / "settings.json"
 LOG_DIR = BASE_DIR / "logs"
-HISTORY_PATH = BASE_DIR / "history.json"  # 新增：撤销功能
+HISTORY_PATH = BASE_DIR / "history.jsonl"  # 撤销功能：追加式日志 (JSON Lines)
+LEGACY_HISTORY_PATH = BASE_DIR / "history.json"  # 旧版整文件格式，首次加载时迁移
+HASH_CACHE_PATH = BASE_DIR / "hash_cache.json"  # 重复检测的哈希缓存
+DUPLICATES_PATH = BASE_DIR / "duplicates.jsonl"  # 重复文件记录
+SNAPSHOT_PATH = BASE_DIR / "snapshots.json"  # 监控目录快照，启动时增量补扫
+JOURNAL_PATH = BASE_DIR / "journal.jsonl"  # 移动预写日志，异常退出后恢复未完成的移动
 
 def load_config():
     """读取配置，不存在则返回默认值"""
     if not CONFIG_PATH.exists():
         return {
             "watch_dirs": [],
+            # 按目录的监控选项，例: {"D:\\Downloads": {"recursive": true, "max_depth": 3, "exclude": ["node_modules", ".git"]}}
+            # 递归时自动跳过 ZenFile 自己的分类文件夹
+            "watch_options": {},
             "hotkey": "<ctrl>+<alt>+z",
             "rules": {
                 "01_图片": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".svg"],
@@ -34,7 +43,52 @@ def load_config():
                 "报告": "02_文档/报告",
                 "设计": "01_图片/设计"
             },
-            "ignore_exts": [".tmp", ".crdownload", ".download", ".part", ".opdownload", ".lnk", ".url", ".ini", ".db", ".sys", ".bak", ".log", ".old", ".sav", ".lock"]
+            "ignore_exts": [".tmp", ".crdownload", ".download", ".part", ".opdownload", ".lnk", ".url", ".ini", ".db", ".sys", ".bak", ".log", ".old", ".sav", ".lock"],
+            # 模式规则：glob (如 "IMG_*.HEIC") 或 "re:" 开头的正则，优先于关键词
+            "pattern_rules": {},
+            # gitignore 风格忽略模式，后出现的覆盖先出现的，"!" 开头表示不忽略
+            "ignore_patterns": [],
+            # 名称规则都未命中时，读取文件头识别类型 (如无后缀的 PDF)
+            "content_sniffing": False,
+            "content_rules": {},
+            # 同一文件的连续事件在该静默窗口(秒)后合并为一次整理
+            "event_quiet_window": 1.0,
+            # 后台整理线程数与队列上限
+            "worker_threads": 4,
+            "queue_size": 1000,
+            # 监控目录所在父目录无法监听时 (如整盘拔出)，轮询间隔在该范围内自适应
+            "presence_poll_min": 1.0,
+            "presence_poll_max": 30.0,
+            "run_now_workers": 8,
+            "undo_workers": 8,
+            # 跨盘移动后的校验方式: "none" / "size" / "hash"
+            "move_verify": "size",
+            # 同名冲突时的重复文件处理: "off" / "skip" 留在原处 / "hardlink" 硬链接 / "record" 仅记录
+            "dedup_mode": "off",
+            "dedup_workers": 2,
+            # 文件就绪判断：修改时间超过该秒数视为写入完成；未就绪时按指数退避重试
+            "ready_settle_time": 2.0,
+            "retry_base_delay": 0.5,
+            "retry_max_delay": 30.0,
+            "retry_max_attempts": 10,
+            # 历史记录条数上限：超出时按整批淘汰最早的批次 (最近的批次总能完整撤销)
+            "history_max_records": 1000,
+            # 移动日志每次提交后是否 fsync：关闭时可承受进程被杀，开启后还能承受断电 (较慢)
+            "journal_fsync": False,
+            # 监听 settings.json，手动修改后自动重新加载
+            "config_hot_reload": True,
+            # 指标导出：端口为 0 时不开启 HTTP (仅监听 127.0.0.1)；文件为空时不写文件
+            "metrics_port": 0,
+            "metrics_file": "",
+            "metrics_interval": 15,
+            # 日志：后台线程写入；按大小 ("size") 或每天 ("time") 轮转；格式 "text" / "json"
+            "log_format": "text",
+            "log_rotate": "size",
+            "log_max_bytes": 5 * 1024 * 1024,
+            "log_backup_count": 5,
+            # 事件风暴时每秒最多记录的普通日志条数 (0 为不限)，超出后每 N 条抽样保留 1 条
+            "log_rate_limit": 50,
+            "log_sample_every": 100
         }
 
     try:
@@ -44,8 +98,72 @@ def load_config():
         return load_config()
 
 def save_config(config):
+    # 先写临时文件再替换，配置热重载不会读到写了一半的文件
+    tmp = CONFIG_PATH.with_suffix(".json.tmp")
     try:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, CONFIG_PATH)
     except Exception as e:
-        print(f"保存配置失败: {e}")
\ No newline at end of file
+        print(f"保存配置失败: {e}")
+
+_CHOICES = {
+    "dedup_mode": ("off", "skip", "hardlink", "record"),
+    "move_verify": ("none", "size", "hash"),
+    "log_format": ("text", "json"),
+    "log_rotate": ("size", "time"),
+}
+_POSITIVE = ("worker_threads", "queue_size", "run_now_workers", "undo_workers", "dedup_workers",
+             "retry_max_attempts", "log_sample_every", "history_max_records")
+_NON_NEGATIVE = ("event_quiet_window", "ready_settle_time", "retry_base_delay", "retry_max_delay",
+                 "presence_poll_min", "presence_poll_max", "metrics_port", "metrics_interval",
+                 "log_max_bytes", "log_backup_count", "log_rate_limit")
+
+def validate_config(config):
+    """检查配置格式，返回错误描述列表 (为空表示通过)"""
+    if not isinstance(config, dict):
+        return ["配置必须是 JSON 对象"]
+    errors = []
+    def check(key, kind, desc):
+        if key in config and not isinstance(config[key], kind):
+            errors.append(f"{key} 应为{desc}")
+            return False
+        return key in config
+    if check("watch_dirs", list, "列表"):
+        if not all(isinstance(p, str) for p in config["watch_dirs"]):
+            errors.append("watch_dirs 中的每一项应为路径字符串")
+    if check("rules", dict, "对象"):
+        for folder, exts in config["rules"].items():
+            if not isinstance(exts, list) or not all(isinstance(e, str) for e in exts):
+                errors.append(f"rules.{folder} 应为后缀列表")
+    for key in ("keyword_rules", "pattern_rules", "content_rules"):
+        if check(key, dict, "对象") and not all(isinstance(v, str) for v in config[key].values()):
+            errors.append(f"{key} 的值应为文件夹名")
+    for key in ("ignore_exts", "ignore_patterns"):
+        if check(key, list, "列表") and not all(isinstance(v, str) for v in config[key]):
+            errors.append(f"{key} 中的每一项应为字符串")
+    for key in ("pattern_rules", "ignore_patterns"):
+        if not isinstance(config.get(key), (dict, list)): continue
+        for pattern in config[key]:
+            if not isinstance(pattern, str): continue
+            pattern = pattern[1:] if key == "ignore_patterns" and pattern.startswith("!") else pattern
+            if not pattern.startswith("re:"): continue
+            try:
+                re.compile(pattern[3:])
+            except re.error as e:
+                errors.append(f"{key} 中的正则无效 {pattern}: {e}")
+    if check("watch_options", dict, "对象"):
+        for path, opts in config["watch_options"].items():
+            if not isinstance(opts, dict):
+                errors.append(f"watch_options.{path} 应为对象")
+    for key, choices in _CHOICES.items():
+        if key in config and config[key] not in choices:
+            errors.append(f"{key} 只能是 {' / '.join(choices)}")
+    for key in _POSITIVE + _NON_NEGATIVE:
+        if key not in config: continue
+        value = config[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append(f"{key} 应为数字")
+        elif value < 0 or (key in _POSITIVE and value < 1):
+            errors.append(f"{key} 超出范围: {value}")
+    return errors
\ No newline at end of file
@@ -1,23 +1,148 @@
+import atexit
+import json
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from .config import LOG_DIR  # 引用同级模块的变量
 
+_listener = None
+_queue_handler = None
 
-def setup_logger():
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON；通过 extra={"fields": {...}} 附带的结构化字段 (如各阶段耗时) 合并输出"""
+
+    def format(self, record):
+        item = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            item.update(fields)
+        return json.dumps(item, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    事件风暴时限流：INFO 及以下按消息前缀 (如 "整理") 分别用令牌桶限制每秒条数，
+    超出部分每 sample_every 条保留 1 条，其余丢弃并在该前缀下一条放行的日志末尾注明省略数量；
+    WARNING 及以上不受限制，其他前缀 (如批次汇总) 也不会被风暴挤掉
+    """
+
+    MAX_KEYS = 1000
+
+    def __init__(self, rate=50, sample_every=100):
+        super().__init__()
+        self.rate = rate
+        self.sample_every = max(1, int(sample_every))
+        self._buckets = {}  # 前缀 -> [令牌, 上次时间, 连续超限数, 已省略数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not self.rate or record.levelno >= logging.WARNING:
+            return True
+        key = str(record.msg).split(":", 1)[0][:32]
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [float(self.rate), now, 0, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = 0
+            else:
+                bucket[2] += 1
+                if bucket[2] % self.sample_every:
+                    bucket[3] += 1
+                    return False
+            suppressed, bucket[3] = bucket[3], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} (期间省略 {suppressed} 条日志)"
+            record.args = None
+        return True
+
+
+class _DropQueueHandler(QueueHandler):
+    """队列满时直接丢弃，不阻塞整理线程"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger(config=None):
+    """
+    日志写入在后台线程完成：整理线程只把记录放入队列
+    config 可选项: log_format ("text"/"json")、log_rotate ("size"/"time")、log_max_bytes、
+    log_backup_count、log_rate_limit (每秒条数，0 为不限)、log_sample_every、log_console
+    """
+    global _listener, _queue_handler
+    config = config or {}
     LOG_DIR.mkdir(exist_ok=True)
     logger = logging.getLogger("ZenFile")
     logger.setLevel(logging.INFO)
     if logger.handlers: return logger
 
     formatter = logging.Formatter('%(asctime)s - %(message)s')
+    file_formatter = JsonFormatter() if config.get("log_format") == "json" else formatter
 
-    # 文件日志
-    file_handler = logging.FileHandler(LOG_DIR / "app.log", encoding="utf-8")
-    file_handler.setFormatter(formatter)
+    # 文件日志：按大小或按天轮转
+    backups = config.get("log_backup_count", 5)
+    if config.get("log_rotate") == "time":
+        file_handler = TimedRotatingFileHandler(LOG_DIR / "app.log", when="midnight",
+                                                backupCount=backups, encoding="utf-8")
+    else:
+        file_handler = RotatingFileHandler(LOG_DIR / "app.log", maxBytes=config.get("log_max_bytes", 5 * 1024 * 1024),
+                                           backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(file_formatter)
+    handlers = [file_handler]
 
     # 控制台日志
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
+    if config.get("log_console", True):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    return logger
\ No newline at end of file
+    log_queue = queue.Queue(maxsize=10000)
+    queue_handler = _DropQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(config.get("log_rate_limit", 50), config.get("log_sample_every", 100)))
+    logger.addHandler(queue_handler)
+    _queue_handler = queue_handler
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logger)
+    return logger
+
+
+def shutdown_logger():
+    """
+    写完队列中剩余的日志并停止后台线程 (os._exit 前需手动调用)
+    之后的日志 (如 atexit、非守护线程中) 改为直接写入文件/控制台，不会进入无人读取的队列
+    可重复调用；之后再调用 setup_logger 直接返回已有的 logger
+    """
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    queue_handler, _queue_handler = _queue_handler, None
+    if not listener: return
+    logger = logging.getLogger("ZenFile")
+    logger.removeHandler(queue_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+        logger.addHandler(handler)
@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "zenfile_"
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def _format_labels(items):
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class _Histogram:
+    """累计次数与总和；分位数按最近 window 个样本计算"""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered: return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Metrics:
+    """
+    进程内指标：计数器、耗时直方图 (p50/p95/p99)、队列深度等即时值
+    各模块直接使用模块级实例 metrics，由 MetricsExporter 对外暴露
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name, labels=None, value=1):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels=None):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(self.window)
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """计时上下文；as 得到的 dict 在退出后带有 "seconds"，可用于结构化日志"""
+        start = time.perf_counter()
+        timing = {}
+        try:
+            yield timing
+        finally:
+            timing["seconds"] = time.perf_counter() - start
+            self.observe(name, timing["seconds"], labels)
+
+    def stage(self, stage):
+        """各处理阶段耗时统一记到 stage_seconds{stage=...}"""
+        return self.timer("stage_seconds", {"stage": stage})
+
+    def gauge(self, name, func, labels=None):
+        """注册即时值 (如队列深度)，导出时调用 func() 读取；同名重复注册会覆盖"""
+        with self._lock:
+            self._gauges[_key(name, labels)] = func
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # ---------- 导出 ----------
+    def _read(self):
+        with self._lock:
+            counters = dict(self._counters)
+            hists = {k: (h.count, h.sum, h.quantiles()) for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+        values = {}
+        for key, func in gauges.items():
+            try:
+                values[key] = func()
+            except Exception:
+                pass
+        return counters, hists, values
+
+    def snapshot(self):
+        counters, hists, gauges = self._read()
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(gauges.items())],
+            "histograms": [
+                {"name": n, "labels": dict(l), "count": c, "sum": round(s, 6),
+                 **{f"p{int(q * 100)}": round(v, 6) for q, v in qs.items()}}
+                for (n, l), (c, s, qs) in sorted(hists.items())
+            ],
+        }
+
+    def prometheus(self):
+        """Prometheus 文本格式 (直方图以 summary 形式导出)"""
+        counters, hists, gauges = self._read()
+        lines, typed = [], set()
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        for (name, labels), value in sorted(counters.items()):
+            full = PREFIX + name + "_total"
+            declare(full, "counter")
+            lines.append(f"{full}{_format_labels(labels)} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            declare(PREFIX + name, "gauge")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), (count, total, qs) in sorted(hists.items()):
+            full = PREFIX + name
+            declare(full, "summary")
+            for q, v in qs.items():
+                lines.append(f"{full}{_format_labels(labels + (('quantile', q),))} {v:.6f}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{full}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsExporter:
+    """
+    对外暴露指标
+    - metrics_port > 0 时在 127.0.0.1 上提供 HTTP: /metrics (Prometheus 文本)、/metrics.json
+    - metrics_file 非空时每 metrics_interval 秒写入文件 (.json 后缀为 JSON，否则为 Prometheus 文本)
+    """
+
+    def __init__(self, config, logger=None):
+        self.port = int(config.get("metrics_port", 0) or 0)
+        self.file = config.get("metrics_file", "")
+        self.interval = config.get("metrics_interval", 15)
+        self.logger = logger
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.port:
+            self._start_http()
+        if self.file:
+            self._thread = threading.Thread(target=self._dump_loop, name="ZenFile-Metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+            self.dump()
+
+    def _start_http(self):
+        # 仅在启用时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/", "/metrics"):
+                    body, ctype = metrics.prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, ctype = json.dumps(metrics.snapshot(), ensure_ascii=False), "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            if self.logger: self.logger.error(f"指标服务启动失败 (端口 {self.port}): {e}")
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="ZenFile-MetricsHTTP", daemon=True).start()
+        if self.logger: self.logger.info(f"指标服务已启动: http://127.0.0.1:{self.port}/metrics")
+
+    def dump(self):
+        if not self.file: return
+        text = (json.dumps(metrics.snapshot(), ensure_ascii=False, indent=2)
+                if str(self.file).endswith(".json") else metrics.prometheus())
+        tmp = f"{self.file}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.file)
+        except Exception as e:
+            if self.logger: self.logger.error(f"写入指标文件失败: {e}")
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
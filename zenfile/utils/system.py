@@ -1,6 +1,5 @@
 import sys
 import os
-import winreg
 
 def get_resource_path(relative_path):
     """获取资源文件的绝对路径 (支持打包后)"""
@@ -14,10 +13,12 @@ def get_exe_path():
     return sys.argv[0]
 
 # --- Windows 开机自启逻辑 ---
+# winreg 仅 Windows 可用，在函数内导入，其他平台导入本模块不会失败
 def set_autorun(enable=True):
     key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
     exe_path = get_exe_path()
     try:
+        import winreg
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, key_path, 0, winreg.KEY_ALL_ACCESS)
         if enable:
             winreg.SetValueEx(key, "ZenFile", 0, winreg.REG_SZ, exe_path)
@@ -34,9 +35,10 @@ def set_autorun(enable=True):
 
 def is_autorun_enabled():
     try:
+        import winreg
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0, winreg.KEY_READ)
         winreg.QueryValueEx(key, "ZenFile")
         winreg.CloseKey(key)
         return True
-    except FileNotFoundError:
+    except (FileNotFoundError, ImportError):
         return False
\ No newline at end of file